@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backend.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# After the soft TTL an entry is served stale while a background refresh runs;
+# after the hard TTL Redis drops it and callers wait for a fresh load.
+DETAILS_SOFT_TTL = int(os.getenv("DETAILS_SOFT_TTL", "86400"))
+DETAILS_HARD_TTL = int(os.getenv("DETAILS_HARD_TTL", str(7 * 86400)))
+# Upper bound on one load; also how long other workers wait on the lock holder
+DETAILS_LOCK_TTL = float(os.getenv("DETAILS_LOCK_TTL", "30"))
+LOCK_POLL_INTERVAL = 0.1
+
+# Delete the lock only if we still own it
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+Loader = Callable[[str], Awaitable[Tuple[dict, int]]]
+
+
+class CourseDetailsCache:
+    """
+    Stale-while-revalidate cache for /course/{code}/details with single-flight
+    loading: one load per course code per process (shared asyncio task) and, via
+    a Redis lock, one per code across workers. `loader` returns (payload, soft_ttl).
+    """
+
+    def __init__(self, redis_client, loader: Loader, soft_ttl: int = DETAILS_SOFT_TTL,
+                 hard_ttl: int = DETAILS_HARD_TTL, lock_ttl: float = DETAILS_LOCK_TTL):
+        # redis_client must be created with decode_responses=True
+        self.redis = redis_client
+        self.loader = loader
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.lock_ttl = lock_ttl
+        self._inflight = {}
+        self._background = set()
+
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.loads = 0
+
+    @staticmethod
+    def cache_key(course_code: str) -> str:
+        return f"course_details:{course_code}"
+
+    def _decode(self, cached: Optional[str]) -> Optional[dict]:
+        if not cached:
+            return None
+        entry = json.loads(cached)
+        if "fresh_until" not in entry:
+            # Plain payloads written before SWR entries existed
+            entry = {"data": entry, "fresh_until": time.time() + self.soft_ttl}
+        return entry
+
+    async def _read(self, course_code: str) -> Optional[dict]:
+        with stage("cache"):
+            return self._decode(await self.redis.get(self.cache_key(course_code)))
+
+    async def write(self, course_code: str, data: dict, soft_ttl: Optional[int] = None):
+        soft_ttl = self.soft_ttl if soft_ttl is None else soft_ttl
+        entry = {"data": data, "fresh_until": time.time() + soft_ttl}
+        await self.redis.setex(self.cache_key(course_code), max(self.hard_ttl, soft_ttl), json.dumps(entry))
+
+    async def read_many(self, course_codes: List[str]) -> Dict[str, dict]:
+        """One MGET for many codes. Returns entries for the codes that are cached."""
+        if not course_codes:
+            return {}
+        with stage("cache"):
+            values = await self.redis.mget([self.cache_key(code) for code in course_codes])
+        entries = {}
+        for code, cached in zip(course_codes, values):
+            entry = self._decode(cached)
+            if entry is not None:
+                entries[code] = entry
+        return entries
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() < entry["fresh_until"]
+
+    async def get_many(self, course_codes: List[str], loader: Optional[Loader] = None, concurrency: int = 8,
+                       cached: Optional[Dict[str, dict]] = None) -> Dict[str, Tuple[str, Optional[dict]]]:
+        """
+        Resolve many codes at once: cache hits come from a single MGET, misses are
+        loaded concurrently (at most `concurrency` at a time) through the same
+        single-flight path as get(). Returns code -> (status, payload) where status
+        is "fresh", "stale", "loaded" or "error"; one failure never fails the batch.
+        Pass `cached` if read_many() was already called for these codes.
+        """
+        entries = cached if cached is not None else await self.read_many(course_codes)
+        results = {}
+        for code, entry in entries.items():
+            if self.is_fresh(entry):
+                self.fresh_hits += 1
+                results[code] = ("fresh", entry["data"])
+            else:
+                self.stale_hits += 1
+                self._refresh_in_background(code)
+                results[code] = ("stale", entry["data"])
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def load(code: str):
+            async with semaphore:
+                try:
+                    self.misses += 1
+                    data = await self._single_flight(code, wait_for_others=True, loader=loader)
+                    if data is None:
+                        data, soft_ttl = await (loader or self.loader)(code)
+                        await self.write(code, data, soft_ttl)
+                    results[code] = ("loaded", data)
+                except Exception as e:
+                    logger.error(f"Batch course details load failed for {code}: {e!r}")
+                    results[code] = ("error", None)
+
+        await asyncio.gather(*(load(code) for code in course_codes if code not in entries))
+        return results
+
+    async def get(self, course_code: str) -> dict:
+        entry = await self._read(course_code)
+        if entry is not None:
+            if self.is_fresh(entry):
+                self.fresh_hits += 1
+            else:
+                self.stale_hits += 1
+                self._refresh_in_background(course_code)
+            return entry["data"]
+
+        self.misses += 1
+        data = await self._single_flight(course_code, wait_for_others=True)
+        if data is None:
+            # Joined a background refresh that deferred to another worker
+            data, soft_ttl = await self.loader(course_code)
+            await self.write(course_code, data, soft_ttl)
+        return data
+
+    def _refresh_in_background(self, course_code: str):
+        if course_code in self._inflight:
+            return
+        task = asyncio.create_task(self._single_flight(course_code, wait_for_others=False))
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background course details refresh failed: {task.exception()!r}")
+
+    async def _single_flight(self, course_code: str, wait_for_others: bool,
+                             loader: Optional[Loader] = None) -> Optional[dict]:
+        task = self._inflight.get(course_code)
+        if task is None:
+            task = asyncio.create_task(self._load_with_lock(course_code, wait_for_others, loader))
+            self._inflight[course_code] = task
+            task.add_done_callback(lambda _: self._inflight.pop(course_code, None))
+        else:
+            self.coalesced += 1
+        # Shield so one caller disconnecting doesn't cancel the load for everyone
+        return await asyncio.shield(task)
+
+    async def _load_with_lock(self, course_code: str, wait_for_others: bool,
+                              loader: Optional[Loader] = None) -> Optional[dict]:
+        lock_key = f"lock:{self.cache_key(course_code)}"
+        token = uuid.uuid4().hex
+        acquired = await self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+
+        if not acquired:
+            if not wait_for_others:
+                # Another worker is already refreshing this code
+                return None
+            deadline = time.monotonic() + self.lock_ttl
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+                entry = await self._read(course_code)
+                if entry is not None:
+                    self.coalesced += 1
+                    return entry["data"]
+                if not await self.redis.exists(lock_key):
+                    break
+            # The holder gave up or died; load it ourselves
+
+        try:
+            self.loads += 1
+            data, soft_ttl = await (loader or self.loader)(course_code)
+            await self.write(course_code, data, soft_ttl)
+            return data
+        finally:
+            if acquired:
+                try:
+                    await self.redis.eval(_RELEASE_LOCK, 1, lock_key, token)
+                except Exception as e:
+                    logger.warning(f"Failed to release {lock_key}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "loads": self.loads,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# How long the collector waits for more queries after the first one arrives,
+# and the most queries it will fold into a single model.encode call.
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+# Number of batches allowed to run inference at the same time.
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+
+
+class BatchingEncoder:
+    """
+    Runs SentenceTransformer inference in a worker thread pool so the event loop
+    never blocks on a forward pass. Concurrent callers are collected over a short
+    window and encoded together as one batch.
+    """
+
+    def __init__(self, model, max_batch_size: int = EMBED_MAX_BATCH_SIZE,
+                 batch_window_ms: float = EMBED_BATCH_WINDOW_MS, workers: int = EMBED_WORKERS):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_window = max(0.0, batch_window_ms) / 1000.0
+        self.workers = max(1, workers)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embed")
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+        # Metrics
+        self.requests_total = 0
+        self.batches_total = 0
+        self.max_batch_seen = 0
+        self.encode_seconds_total = 0.0
+        self.batch_size_histogram = {}
+
+    async def start(self):
+        if self._collector is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._collector = asyncio.create_task(self._collect_loop())
+        logger.info(
+            f"Embedding encoder started (window={self.batch_window * 1000:.1f}ms, "
+            f"max_batch={self.max_batch_size}, workers={self.workers})"
+        )
+
+    async def stop(self):
+        if self._collector is None:
+            return
+        self._collector.cancel()
+        try:
+            await self._collector
+        except asyncio.CancelledError:
+            pass
+        self._collector = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        # Fail anything still waiting so callers don't hang forever
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding encoder stopped"))
+        self._executor.shutdown(wait=False)
+
+    async def encode(self, text: str):
+        """Queue a single text for encoding and wait for its vector."""
+        if self._collector is None:
+            raise RuntimeError("Embedding encoder not started")
+        future = asyncio.get_running_loop().create_future()
+        self.requests_total += 1
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free inference slot before draining the queue, so requests
+            # that arrive while the model is busy pile up into the next batch.
+            await self._slots.acquire()
+            try:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + self.batch_window
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        # Window closed; still take whatever is already queued
+                        while len(batch) < self.max_batch_size and not self._queue.empty():
+                            batch.append(self._queue.get_nowait())
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        continue
+            except BaseException:
+                self._slots.release()
+                raise
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch):
+        texts = [text for text, _ in batch]
+        futures = [future for _, future in batch]
+        try:
+            start = time.perf_counter()
+            embeddings = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._encode_sync, texts
+            )
+            self._record_batch(len(texts), time.perf_counter() - start)
+            for future, embedding in zip(futures, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        except Exception as e:
+            logger.error(f"Batch encode of {len(texts)} queries failed: {e}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def _encode_sync(self, texts: List[str]):
+        return self.model.encode(texts, batch_size=len(texts), convert_to_tensor=False)
+
+    def _record_batch(self, size: int, seconds: float):
+        self.batches_total += 1
+        self.encode_seconds_total += seconds
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> dict:
+        items = sum(size * count for size, count in self.batch_size_histogram.items())
+        return {
+            "queue_depth": self.queue_depth,
+            "inflight_batches": len(self._inflight),
+            "requests_total": self.requests_total,
+            "batches_total": self.batches_total,
+            "avg_batch_size": items / self.batches_total if self.batches_total else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_encode_ms": (self.encode_seconds_total / self.batches_total * 1000) if self.batches_total else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_size_histogram.items())),
+        }
@@ -0,0 +1,102 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", str(7 * 86400)))
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivial variants share a cache entry."""
+    return " ".join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+
+    Tier 1 is a bounded in-process LRU of float32 vectors. Tier 2 is Redis, where
+    vectors are stored as packed float32 bytes so every uvicorn worker shares warm
+    entries. Keys cover the normalized query, the model name and the prompt prefix.
+    """
+
+    def __init__(self, redis_client, model_name: str, prefix: str,
+                 maxsize: int = QUERY_CACHE_SIZE, ttl: int = QUERY_CACHE_TTL):
+        # redis_client must be created with decode_responses=False
+        self.redis = redis_client
+        self.model_name = model_name
+        self.prefix = prefix
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lru = OrderedDict()
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+    def _key(self, normalized: str) -> str:
+        digest = hashlib.sha1(f"{self.model_name}\0{self.prefix}\0{normalized}".encode()).hexdigest()
+        return f"query_emb:{digest}"
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    async def get(self, query: str) -> Optional[np.ndarray]:
+        key = self._key(normalize_query(query))
+
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+            self.local_hits += 1
+            return vector
+
+        if self.redis is not None:
+            try:
+                packed = await self.redis.get(key)
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"Query embedding cache read failed: {e}")
+                packed = None
+            if packed:
+                vector = np.frombuffer(packed, dtype=np.float32)
+                self._remember(key, vector)
+                self.redis_hits += 1
+                return vector
+
+        self.misses += 1
+        return None
+
+    async def set(self, query: str, vector) -> np.ndarray:
+        key = self._key(normalize_query(query))
+        vector = np.asarray(vector, dtype=np.float32)
+        self._remember(key, vector)
+
+        if self.redis is not None:
+            try:
+                await self.redis.setex(key, self.ttl, vector.tobytes())
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"Query embedding cache write failed: {e}")
+        return vector
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "size": len(self._lru),
+            "maxsize": self.maxsize,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "redis_errors": self.redis_errors,
+            "hit_ratio": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,56 @@
+import json
+import os
+from typing import Iterator, Optional
+
+import numpy as np
+
+# Output of scraper/embed.py: raw float32 vectors (one row per course, in order),
+# course metadata as JSONL in the same order, and a manifest that doubles as the
+# resume checkpoint.
+EMBEDDINGS_FILE = "scraper/courses_embedded.f32"
+METADATA_FILE = "scraper/courses_embedded.jsonl"
+MANIFEST_FILE = "scraper/courses_embedded.manifest.json"
+
+
+def read_manifest(path: str = MANIFEST_FILE) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(manifest: dict, path: str = MANIFEST_FILE):
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def load_vectors(manifest: dict, path: str = EMBEDDINGS_FILE) -> np.ndarray:
+    """Memory-map the completed rows of the raw vector file as a (count, dim) matrix."""
+    count, dim = manifest["count"], manifest["dim"]
+    if count == 0:
+        return np.empty((0, dim), dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode="r", shape=(count, dim))
+
+
+def iter_metadata(path: str = METADATA_FILE, limit: Optional[int] = None) -> Iterator[dict]:
+    with open(path) as f:
+        for i, line in enumerate(f):
+            if limit is not None and i >= limit:
+                return
+            yield json.loads(line)
+
+
+def iter_embedded_courses(manifest_path: str = MANIFEST_FILE, embeddings_path: str = EMBEDDINGS_FILE,
+                          metadata_path: str = METADATA_FILE) -> Iterator[dict]:
+    """Yield course dicts with an 'embedding' row, without loading everything at once."""
+    manifest = read_manifest(manifest_path)
+    if manifest is None:
+        raise FileNotFoundError(manifest_path)
+    vectors = load_vectors(manifest, embeddings_path)
+    for i, course in enumerate(iter_metadata(metadata_path, manifest["count"])):
+        course["embedding"] = np.asarray(vectors[i])
+        yield course
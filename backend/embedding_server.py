@@ -0,0 +1,180 @@
+"""
+One process that owns the query model and encodes for every uvicorn worker on
+the box, so N workers don't mean N model copies in RAM.
+
+    python -m backend.embedding_server --socket /tmp/nyu-embed.sock
+    EMBED_SERVER_URL=unix:///tmp/nyu-embed.sock uvicorn backend.main:app --workers 4
+
+Requests from all workers land in the server's BatchingEncoder, so concurrent
+queries are still folded into shared forward passes.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# "unix:///path/to.sock" or "http://127.0.0.1:8100"; unset keeps the model in-process
+EMBED_SERVER_URL = os.getenv("EMBED_SERVER_URL")
+EMBED_SERVER_TIMEOUT = float(os.getenv("EMBED_SERVER_TIMEOUT", "5"))
+EMBED_SERVER_CONNECTIONS = int(os.getenv("EMBED_SERVER_CONNECTIONS", "16"))
+# Most texts one /encode request may carry
+EMBED_SERVER_MAX_TEXTS = int(os.getenv("EMBED_SERVER_MAX_TEXTS", "64"))
+
+MODEL_NAME = "nomic-ai/nomic-embed-text-v1.5"
+# Host header for requests over a Unix socket; never resolved
+_SOCKET_BASE = "http://embedding-server"
+
+
+class EmbeddingServerError(Exception):
+    """The embedding server could not be reached, timed out or refused the request."""
+
+
+class EmbeddingClient:
+    """
+    Async client for the embedding server with the same encode()/stats() surface
+    as BatchingEncoder. One keep-alive connection pool per worker.
+    """
+
+    def __init__(self, url: str = EMBED_SERVER_URL, timeout: float = EMBED_SERVER_TIMEOUT,
+                 connections: int = EMBED_SERVER_CONNECTIONS):
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.connections = connections
+        self.session: Optional[aiohttp.ClientSession] = None
+        if url.startswith("unix://"):
+            self.socket_path, self.base_url = url[len("unix://"):], _SOCKET_BASE
+        else:
+            self.socket_path, self.base_url = None, url.rstrip("/")
+
+        self.requests_total = 0
+        self.texts_total = 0
+        self.failures_total = 0
+        self.seconds_total = 0.0
+
+    async def start(self):
+        if self.session is None:
+            if self.socket_path:
+                connector = aiohttp.UnixConnector(path=self.socket_path, limit=self.connections)
+            else:
+                connector = aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def stop(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def encode(self, text: str) -> np.ndarray:
+        return (await self.encode_many([text]))[0]
+
+    async def encode_many(self, texts: List[str]) -> np.ndarray:
+        """A (len(texts), dim) float32 matrix. Raises EmbeddingServerError on any failure."""
+        if self.session is None:
+            raise EmbeddingServerError("Embedding client not started")
+        self.requests_total += 1
+        self.texts_total += len(texts)
+        start = time.perf_counter()
+        try:
+            async with self.session.post(f"{self.base_url}/encode", json={"texts": texts}) as response:
+                if response.status != 200:
+                    raise EmbeddingServerError(f"Embedding server returned HTTP {response.status}")
+                body = await response.read()
+                dim = int(response.headers["X-Embedding-Dim"])
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e:
+            self.failures_total += 1
+            raise EmbeddingServerError(f"Embedding server request failed: {e!r}") from e
+        except EmbeddingServerError:
+            self.failures_total += 1
+            raise
+        finally:
+            self.seconds_total += time.perf_counter() - start
+        return np.frombuffer(body, dtype="<f4").reshape(len(texts), dim)
+
+    def stats(self) -> dict:
+        return {
+            "server": self.url,
+            "requests_total": self.requests_total,
+            "texts_total": self.texts_total,
+            "failures_total": self.failures_total,
+            "avg_request_ms": (self.seconds_total / self.requests_total * 1000) if self.requests_total else 0.0,
+        }
+
+
+def create_app(loader) -> web.Application:
+    """Routes over a ModelLoader: POST /encode, GET /health, GET /stats."""
+
+    async def encode(request: web.Request) -> web.Response:
+        if not loader.ready:
+            return web.json_response({"detail": f"Model {loader.state}"}, status=503, headers={"Retry-After": "5"})
+        try:
+            texts = (await request.json())["texts"]
+        except (ValueError, KeyError, TypeError):
+            return web.json_response({"detail": "Expected {\"texts\": [...]}"}, status=400)
+        if not isinstance(texts, list) or not texts or not all(isinstance(t, str) for t in texts):
+            return web.json_response({"detail": "texts must be a non-empty list of strings"}, status=400)
+        if len(texts) > EMBED_SERVER_MAX_TEXTS:
+            return web.json_response({"detail": f"At most {EMBED_SERVER_MAX_TEXTS} texts per request"}, status=413)
+        # Each text joins the shared batcher, so requests from different workers share forward passes
+        vectors = await asyncio.gather(*(loader.encoder.encode(t) for t in texts))
+        matrix = np.asarray(vectors, dtype="<f4")
+        return web.Response(
+            body=matrix.tobytes(),
+            content_type="application/octet-stream",
+            headers={"X-Embedding-Dim": str(matrix.shape[1])},
+        )
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response(loader.status(), status=200 if loader.ready else 503)
+
+    async def stats(request: web.Request) -> web.Response:
+        if not loader.ready:
+            return web.json_response({"detail": f"Model {loader.state}"}, status=503)
+        return web.json_response(loader.encoder.stats())
+
+    async def on_startup(app):
+        loader.start()
+
+    async def on_cleanup(app):
+        await loader.stop()
+
+    app = web.Application()
+    app.router.add_post("/encode", encode)
+    app.router.add_get("/health", health)
+    app.router.add_get("/stats", stats)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main():
+    from backend.model_loader import ModelLoader
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Serve query embeddings to every API worker from one model copy")
+    parser.add_argument("--socket", help="Unix socket path (preferred on a single host)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--model", default=MODEL_NAME)
+    args = parser.parse_args()
+
+    # The server always holds the model itself, whatever EMBED_SERVER_URL says
+    loader = ModelLoader(args.model, "search_query: warm up", server_url=None)
+    app = create_app(loader)
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        web.run_app(app, path=args.socket)
+    else:
+        web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
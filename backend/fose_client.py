@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+FOSE_CONNECTIONS_PER_HOST = int(os.getenv("FOSE_CONNECTIONS_PER_HOST", "8"))
+FOSE_TIMEOUT = float(os.getenv("FOSE_TIMEOUT", "5"))
+FOSE_RETRIES = int(os.getenv("FOSE_RETRIES", "2"))
+FOSE_BACKOFF_BASE = float(os.getenv("FOSE_BACKOFF_BASE", "0.2"))
+# Consecutive failures before the breaker opens, and how long it stays open
+FOSE_BREAKER_THRESHOLD = int(os.getenv("FOSE_BREAKER_THRESHOLD", "5"))
+FOSE_BREAKER_RESET = float(os.getenv("FOSE_BREAKER_RESET", "30"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling FOSE while the circuit breaker is open."""
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, threshold: int = FOSE_BREAKER_THRESHOLD, reset_timeout: float = FOSE_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def cancel_trial(self):
+        """A trial call was cancelled before it finished; let the next caller retry."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.threshold:
+            if self.opened_at is None or self._trial_in_flight:
+                logger.warning(f"FOSE circuit breaker opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+
+class FoseClient:
+    """
+    Long-lived HTTP client for the NYU Class Search (FOSE) API: one keep-alive
+    connection pool with a per-host connection cap, bounded retries with jittered
+    exponential backoff on 5xx/timeouts, and a circuit breaker.
+    """
+
+    def __init__(self, limit_per_host: int = FOSE_CONNECTIONS_PER_HOST, timeout: float = FOSE_TIMEOUT,
+                 retries: int = FOSE_RETRIES, backoff_base: float = FOSE_BACKOFF_BASE,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.breaker = breaker or CircuitBreaker()
+        self.session: Optional[aiohttp.ClientSession] = None
+
+        self.requests_total = 0
+        self.retries_total = 0
+        self.failures_total = 0
+        self.rejected_total = 0
+
+    async def start(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit_per_host=self.limit_per_host, keepalive_timeout=60, ssl=False)
+            self.session = aiohttp.ClientSession(connector=connector, headers=HEADERS, timeout=self.timeout)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.state != "open"
+
+    async def post_json(self, url: str, payload: dict) -> Optional[dict]:
+        """
+        POST and decode JSON. Returns None for non-retryable HTTP errors, raises
+        CircuitOpenError while the breaker is open and re-raises the last error
+        once retries are exhausted.
+        """
+        if not self.breaker.allow():
+            self.rejected_total += 1
+            raise CircuitOpenError("FOSE circuit breaker is open")
+
+        for attempt in range(self.retries + 1):
+            self.requests_total += 1
+            try:
+                async with self.session.post(url, json=payload) as response:
+                    if response.status >= 500 or response.status == 429:
+                        raise RetryableStatus(response.status)
+                    if response.status != 200:
+                        self.breaker.record_success()
+                        return None
+                    data = await response.json(content_type=None)
+                    self.breaker.record_success()
+                    return data
+            except (RetryableStatus, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    self.failures_total += 1
+                    self.breaker.record_failure()
+                    raise
+                self.retries_total += 1
+                # Full jitter keeps a burst of retries from arriving in lockstep
+                await asyncio.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+                logger.debug(f"Retrying FOSE request after {e!r} (attempt {attempt + 2})")
+            except asyncio.CancelledError:
+                self.breaker.cancel_trial()
+                raise
+            except Exception:
+                # Malformed responses are not worth retrying, but still count against the breaker
+                self.failures_total += 1
+                self.breaker.record_failure()
+                raise
+
+    def stats(self) -> dict:
+        return {
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "requests_total": self.requests_total,
+            "retries_total": self.retries_total,
+            "failures_total": self.failures_total,
+            "rejected_total": self.rejected_total,
+        }
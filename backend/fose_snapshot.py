@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Tuple
+
+from sqlalchemy import delete, insert, text
+
+from backend.database import engine, Base, CourseSection
+from backend.fose_client import FoseClient
+from backend.live_scraper import (
+    SEARCH_URL, DETAILS_URL, TERMS, MAX_SEMESTERS, term_name, split_instructors,
+    combine_description, build_details_payload
+)
+from backend.prerequisites import details_prerequisites
+
+logger = logging.getLogger(__name__)
+
+# Subject searches / details requests in flight at once during a snapshot
+SNAPSHOT_CONCURRENCY = int(os.getenv("SNAPSHOT_CONCURRENCY", "4"))
+
+
+async def subject_prefixes(conn) -> List[str]:
+    """Subject prefixes such as 'CSCI-UA', taken from the scraped catalog."""
+    result = await conn.execute(text("SELECT DISTINCT split_part(code, ' ', 1) FROM courses ORDER BY 1"))
+    return [row[0] for row in result.all() if row[0]]
+
+
+async def snapshot_term(client: FoseClient, term: str, prefixes: List[str],
+                        concurrency: int = SNAPSHOT_CONCURRENCY):
+    """
+    Pull every section for a term: one keyword search per subject prefix, then
+    one details request per course (restrictions and notes are course-level in
+    practice). Returns (rows, failed_requests).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def search(prefix: str):
+        nonlocal failures
+        data = {"other": {"srcdb": term}, "criteria": [{"field": "keyword", "value": prefix}]}
+        try:
+            async with semaphore:
+                res_data = await client.post_json(SEARCH_URL, data)
+        except Exception as e:
+            failures += 1
+            logger.error(f"Snapshot search failed for {prefix} term {term}: {e!r}")
+            return []
+        # Keyword search also matches mentions in other subjects' titles
+        return [r for r in (res_data or {}).get("results", []) if r.get("code", "").startswith(prefix + " ")]
+
+    sections_by_code: Dict[str, Dict[str, dict]] = {}
+    for results in await asyncio.gather(*(search(p) for p in prefixes)):
+        for r in results:
+            sections_by_code.setdefault(r["code"], {})[r["crn"]] = r
+
+    async def details(code: str, r: dict):
+        nonlocal failures
+        det_data = {
+            "group": f"code:{r['code']}",
+            "key": f"key:{r['key']}",
+            "srcdb": term,
+            "matched": f"crn:{r['crn']}"
+        }
+        try:
+            async with semaphore:
+                return code, (await client.post_json(DETAILS_URL, det_data)) or {}
+        except Exception as e:
+            failures += 1
+            logger.error(f"Snapshot details failed for {code} term {term}: {e!r}")
+            return code, {}
+
+    details_by_code = dict(await asyncio.gather(*(
+        details(code, next(iter(sections.values()))) for code, sections in sections_by_code.items()
+    )))
+
+    rows = []
+    for code, sections in sections_by_code.items():
+        det = details_by_code.get(code, {})
+        # Parsed once here so serving the snapshot never runs the regexes
+        prerequisites = details_prerequisites(combine_description(
+            det.get("description"), det.get("registration_restrictions"), det.get("clssnotes")
+        ))
+        for crn, r in sections.items():
+            rows.append({
+                "course_code": code,
+                "term": term,
+                "crn": crn,
+                "section": r.get("no"),
+                "instructors": split_instructors(r.get("instr", "")),
+                "meets": r.get("meets"),
+                "description": det.get("description"),
+                "restrictions": det.get("registration_restrictions"),
+                "notes": det.get("clssnotes"),
+                "prerequisites": prerequisites,
+            })
+    return rows, failures
+
+
+async def store_term(term: str, rows: List[dict]):
+    """Replace a term's snapshot in one transaction so readers never see it half-written."""
+    async with engine.begin() as conn:
+        await conn.execute(delete(CourseSection).where(CourseSection.term == term))
+        if rows:
+            await conn.execute(insert(CourseSection), rows)
+
+
+async def ensure_snapshot_columns(conn):
+    """Add columns introduced after course_sections was first created."""
+    await conn.execute(text("ALTER TABLE course_sections ADD COLUMN IF NOT EXISTS prerequisites text"))
+
+
+async def details_sources(session, course_codes: List[str]) -> Tuple[Dict[str, dict], Dict[str, str]]:
+    """
+    Everything /course/{code}/details needs from Postgres, in one query: details
+    payloads from the local snapshot, and the catalog prerequisite text stored by
+    populate.py. Codes without snapshot rows (or prerequisites) are absent.
+    """
+    result = await session.execute(text("""
+        SELECT c.code, s.term, s.instructors, s.description, s.restrictions, s.notes, s.prerequisites,
+               p.raw_text
+        FROM unnest(CAST(:codes AS varchar[])) AS c(code)
+        LEFT JOIN course_prerequisites p ON p.course_code = c.code
+        LEFT JOIN course_sections s ON s.course_code = c.code
+        ORDER BY c.code, s.term DESC
+    """), {"codes": list(course_codes)})
+
+    grouped: Dict[str, dict] = {}
+    catalog_prereqs: Dict[str, str] = {}
+    for code, term, instructors, description, restrictions, notes, prerequisites, raw_text in result.all():
+        if raw_text:
+            catalog_prereqs[code] = raw_text
+        if term is None:
+            continue
+        entry = grouped.setdefault(code, {"professors": set(), "terms": [], "prerequisites": None})
+        if term not in entry["terms"]:
+            if len(entry["terms"]) >= MAX_SEMESTERS:
+                continue
+            entry["terms"].append(term)
+        entry["professors"].update(instructors or [])
+        if entry["prerequisites"] is None and (description or restrictions or notes):
+            # Rows come newest term first, so this is the latest description.
+            # Snapshots taken before prerequisites were stored are parsed here.
+            entry["prerequisites"] = prerequisites or details_prerequisites(
+                combine_description(description, restrictions, notes)
+            )
+
+    snapshots = {
+        code: build_details_payload(
+            entry["professors"], [term_name(t) for t in entry["terms"]], entry["prerequisites"] or "None"
+        )
+        for code, entry in grouped.items()
+    }
+    return snapshots, catalog_prereqs
+
+
+async def snapshot_details(session, course_codes: List[str]) -> Dict[str, dict]:
+    """Details payloads for the given codes from the local snapshot."""
+    return (await details_sources(session, course_codes))[0]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Snapshot whole FOSE terms into course_sections")
+    parser.add_argument("--terms", nargs="*", default=TERMS[:MAX_SEMESTERS])
+    parser.add_argument("--concurrency", type=int, default=SNAPSHOT_CONCURRENCY)
+    parser.add_argument("--allow-partial", action="store_true",
+                        help="store a term even if some FOSE requests failed")
+    args = parser.parse_args()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_snapshot_columns(conn)
+        prefixes = await subject_prefixes(conn)
+    logger.info(f"Snapshotting {len(args.terms)} terms across {len(prefixes)} subjects")
+
+    async with FoseClient(limit_per_host=args.concurrency) as client:
+        for term in args.terms:
+            start = time.perf_counter()
+            rows, failures = await snapshot_term(client, term, prefixes, args.concurrency)
+            if failures and not args.allow_partial:
+                logger.error(f"Term {term}: {failures} requests failed; keeping the previous snapshot")
+                continue
+            await store_term(term, rows)
+            logger.info(
+                f"Term {term}: stored {len(rows)} sections for {len({r['course_code'] for r in rows})} courses "
+                f"in {time.perf_counter() - start:.1f}s ({failures} failed requests)"
+            )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
@@ -1,9 +1,11 @@
 import asyncio
 from backend.database import engine, Base
+from backend.planner import ensure_planner_constraints
 
 async def main():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await ensure_planner_constraints(conn)
         print("Created new tables successfully")
 
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.future import select
+
+from backend.database import Course, SEARCH_VECTOR_SQL
+
+SEARCH_VECTOR_INDEX = "ix_courses_search_vector"
+# Same projection as vector_search(): the embedding never leaves Postgres on the hot path
+RESULT_COLUMNS = (Course.code, Course.name, Course.subject, Course.description)
+CODE_PATTERN_INDEX = "ix_courses_code_pattern"
+
+# Standard constant from the reciprocal-rank-fusion paper; damps the head of each list
+RRF_K = 60
+
+# "CSCI-UA 102", "csci-ua102", "CSCI-UA-102", or just "CSCI 102" (any school)
+_COURSE_CODE_RE = re.compile(r"^\s*([A-Za-z]{2,8})(?:-([A-Za-z]{2,3}))?[\s-]*(\d{1,4}[A-Za-z]?)\s*$")
+
+
+async def ensure_lexical_index(conn):
+    """
+    Add the generated tsvector column and its indexes to an existing courses table.
+    create_all only creates missing tables, so this covers databases built earlier.
+    """
+    await conn.execute(text(
+        f"ALTER TABLE courses ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED"
+    ))
+    await conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {SEARCH_VECTOR_INDEX} ON courses USING gin (search_vector)"
+    ))
+    await conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {CODE_PATTERN_INDEX} ON courses (code varchar_pattern_ops)"
+    ))
+
+
+def parse_course_code(query: str) -> Optional[Tuple[str, Optional[str], str]]:
+    """Split a query that looks like a course code into (subject, school, number)."""
+    match = _COURSE_CODE_RE.match(query)
+    if not match:
+        return None
+    subject, school, number = match.groups()
+    return subject.upper(), school.upper() if school else None, number.upper()
+
+
+async def code_lookup(session, query: str, limit: int, clauses: Sequence = ()) -> Optional[list]:
+    """
+    Indexed lookup for queries shaped like a course code, as (code, name, subject,
+    description) rows. Returns None when the query isn't code-shaped, so callers
+    can tell "not a code" from "no such course".
+    """
+    parsed = parse_course_code(query)
+    if parsed is None:
+        return None
+    subject, school, number = parsed
+    if school:
+        stmt = select(*RESULT_COLUMNS).where(Course.code == f"{subject}-{school} {number}")
+    else:
+        stmt = select(*RESULT_COLUMNS).where(Course.code.like(f"{subject}-% {number}")).order_by(Course.code)
+    result = await session.execute(stmt.where(*clauses).limit(limit))
+    return list(result.all())
+
+
+async def lexical_search(session, query: str, limit: int, clauses: Sequence = ()) -> list:
+    """Full-text search over code, name and description, best ts_rank_cd first (same rows as code_lookup)."""
+    tsquery = func.websearch_to_tsquery("english", query)
+    stmt = (
+        select(*RESULT_COLUMNS)
+        .where(Course.search_vector.op("@@")(tsquery), *clauses)
+        .order_by(func.ts_rank_cd(Course.search_vector, tsquery).desc())
+        .limit(limit)
+    )
+    result = await session.execute(stmt)
+    return list(result.all())
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked lists of course codes; each list contributes 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, code in enumerate(ranking, start=1):
+            scores[code] = scores.get(code, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
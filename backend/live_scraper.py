@@ -1,93 +1,162 @@
 import asyncio
-import aiohttp
 import logging
+import os
+from typing import Optional
+from backend.fose_client import FoseClient, CircuitOpenError
+from backend.prerequisites import details_prerequisites
+from backend.metrics import FOSE_ERRORS
 
 logger = logging.getLogger(__name__)
 
-async def fetch_live_course_details(course_code: str):
+FOSE_BASE_URL = os.getenv("FOSE_BASE_URL", "https://bulletins.nyu.edu/class-search/api/")
+SEARCH_URL = f"{FOSE_BASE_URL}?page=fose&route=search"
+DETAILS_URL = f"{FOSE_BASE_URL}?page=fose&route=details"
+
+# Try current and recent terms
+TERMS = ["1254", "1252", "1248", "1246", "1244", "1242", "1240", "1238"]
+# At most this many term searches in flight per course lookup
+FOSE_CONCURRENCY = int(os.getenv("FOSE_CONCURRENCY", "4"))
+# Stop waiting on older terms once this many semesters have turned up
+MAX_SEMESTERS = 3
+
+def term_name(term: str) -> str:
+    # Map term codes roughly
+    if term.endswith("4"): return f"Summer {2000 + int(term[1:3])}"
+    elif term.endswith("2"): return f"Spring {2000 + int(term[1:3])}"
+    elif term.endswith("8"): return f"Fall {2000 + int(term[1:3])}"
+    return f"Term {term}"
+
+def split_instructors(instr: str):
+    # Split multiple instructors
+    return [p.strip() for p in (instr or "").split(",") if p.strip()]
+
+def combine_description(desc: str, restr: str, notes: str) -> str:
+    """Fold FOSE details fields into one string that details_prerequisites can parse."""
+    found_description = desc or ""
+    if restr: found_description += f" \n Restrictions: {restr}"
+    if notes: found_description += f" \n Notes: {notes}"
+    return found_description
+
+async def _search_term(client: FoseClient, semaphore: asyncio.Semaphore, term: str, course_code: str):
+    """
+    Search one term; errors are logged and treated as no results. Returns None
+    for the results when the circuit breaker rejected the call.
+    """
+    data = {"other": {"srcdb": term}, "criteria": [{"field": "keyword", "value": course_code}]}
+    try:
+        async with semaphore:
+            res_data = await client.post_json(SEARCH_URL, data)
+            if res_data:
+                return term, res_data.get("results", [])
+    except CircuitOpenError:
+        return term, None
+    except Exception as e:
+        FOSE_ERRORS.labels(term, "search").inc()
+        logger.error(f"Live scrape error for {course_code} term {term}: {e!r}")
+    return term, []
+
+async def _fetch_details(client: FoseClient, term: str, r: dict) -> Optional[str]:
+    """Full description/restrictions/notes for one matched section; None if the breaker rejected the call."""
+    det_data = {
+        "group": f"code:{r['code']}",
+        "key": f"key:{r['key']}",
+        "srcdb": term,
+        "matched": f"crn:{r['crn']}"
+    }
+    found_description = ""
+    try:
+        det_json = await client.post_json(DETAILS_URL, det_data)
+        if det_json:
+            found_description = combine_description(
+                det_json.get("description", ""),
+                det_json.get("registration_restrictions", ""),
+                det_json.get("clssnotes", ""),
+            )
+    except CircuitOpenError:
+        return None
+    except Exception as e:
+        FOSE_ERRORS.labels(term, "details").inc()
+        logger.error(f"Live details error for {r.get('code')} term {term}: {e!r}")
+    return found_description
+
+async def fetch_live_course_details(course_code: str, client: Optional[FoseClient] = None):
     """
     Scrape live NYU Class Search (FOSE) API for real professors and prerequisites.
+    All terms are searched concurrently; the details request goes out as soon as
+    the first term returns a match. Results are ranked by term code rather than
+    arrival, and we stop once the MAX_SEMESTERS most recent terms with hits are
+    known (no newer term is still in flight).
+
+    Pass the app-scoped FoseClient to reuse its connection pool. Raises
+    CircuitOpenError straight away while FOSE is known to be down, and after the
+    fact if the breaker rejected any of the calls (e.g. while half-open only one
+    trial gets through): a rejected term is unknown, not "not offered".
     """
-    url = "https://bulletins.nyu.edu/class-search/api/?page=fose&route=search"
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    
-    # Try current and recent terms
-    terms = ["1254", "1252", "1248", "1246", "1244", "1242", "1240", "1238"]
-    
-    professors = set()
+    if client is None:
+        async with FoseClient() as own_client:
+            return await fetch_live_course_details(course_code, own_client)
+
+    if not client.available:
+        raise CircuitOpenError("FOSE circuit breaker is open")
+
+    found = {}
     found_description = ""
-    found_semesters = set()
+    semaphore = asyncio.Semaphore(FOSE_CONCURRENCY)
     
-    async with aiohttp.ClientSession() as session:
-        for term in terms:
-            data = {"other": {"srcdb": term}, "criteria": [{"field": "keyword", "value": course_code}]}
-            try:
-                async with session.post(url, headers=headers, json=data, ssl=False) as response:
-                    if response.status == 200:
-                        res_data = await response.json()
-                        results = res_data.get("results", [])
-                        
-                        if results:
-                            # Map term codes roughly
-                            if term.endswith("4"): term_name = f"Summer {2000 + int(term[1:3])}"
-                            elif term.endswith("2"): term_name = f"Spring {2000 + int(term[1:3])}"
-                            elif term.endswith("8"): term_name = f"Fall {2000 + int(term[1:3])}"
-                            else: term_name = f"Term {term}"
-                            found_semesters.add(term_name)
-                            
-                            for r in results:
-                                instr = r.get("instr", "")
-                                if instr:
-                                    # Split multiple instructors
-                                    for p in instr.split(","):
-                                        prof = p.strip()
-                                        if prof: professors.add(prof)
-                                
-                                # Do a details fetch just once to get the full description/prereqs from the first match
-                                if not found_description:
-                                    det_url = "https://bulletins.nyu.edu/class-search/api/?page=fose&route=details"
-                                    det_data = {
-                                        "group": f"code:{r['code']}",
-                                        "key": f"key:{r['key']}",
-                                        "srcdb": term,
-                                        "matched": f"crn:{r['crn']}"
-                                    }
-                                    async with session.post(det_url, headers=headers, json=det_data, ssl=False) as det_resp:
-                                        if det_resp.status == 200:
-                                            det_json = await det_resp.json()
-                                            desc = det_json.get("description", "")
-                                            restr = det_json.get("registration_restrictions", "")
-                                            notes = det_json.get("clssnotes", "")
-                                            if desc: found_description = desc
-                                            if restr: found_description += f" \n Restrictions: {restr}"
-                                            if notes: found_description += f" \n Notes: {notes}"
-            except Exception as e:
-                logger.error(f"Live scrape error for {course_code} term {term}: {e}")
-                
-    import re
-    import html
-    prereqs = "None"
-    extra_notes = ""
-    if found_description:
-        match = re.search(r'(?:Prerequisite|Prereq)[s]?\s*(?:for[a-z\sA-Z-]*)?:?\s*(.*?)(?:\.\s+(?=[A-Z])|$)', found_description, re.IGNORECASE | re.DOTALL)
-        if match:
-            prereqs = " ".join(match.group(1).split())
+    searches = [asyncio.create_task(_search_term(client, semaphore, term, course_code)) for term in TERMS]
+    unfinished = set(TERMS)
+    rejected = False
+    details_task = None
+    try:
+        for next_search in asyncio.as_completed(searches):
+            term, results = await next_search
+            unfinished.discard(term)
+            if results is None:
+                # Keep going rather than cancel: the half-open trial call has
+                # to finish for the breaker to close again
+                rejected = True
+            elif results:
+                found[term] = results
+                # Do a details fetch just once to get the full description/prereqs from the first match
+                if details_task is None:
+                    details_task = asyncio.create_task(_fetch_details(client, term, results[0]))
             
-        restr_match = re.search(r'Restrictions:\s*(.*?)(?: \n|$)', found_description)
-        if restr_match: extra_notes += restr_match.group(1).strip() + ". "
+            # A slow response for a newer term could still displace older hits
+            newest_unfinished = max(unfinished, default="")
+            if sum(t > newest_unfinished for t in found) >= MAX_SEMESTERS:
+                break
         
-        notes_match = re.search(r'Notes:\s*(.*)', found_description)
-        if notes_match: extra_notes += notes_match.group(1).strip()
+        if details_task is not None:
+            found_description = await details_task
+            if found_description is None:
+                rejected = True
+    finally:
+        pending = searches + ([details_task] if details_task is not None else [])
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
 
-    if extra_notes and prereqs == "None":
-        prereqs = extra_notes.strip()
-    elif extra_notes:
-        prereqs = prereqs + " | Notes: " + extra_notes.strip()
-        
+    if rejected:
+        # A partial answer would be cached as if complete; let the caller use its fallback
+        raise CircuitOpenError("FOSE circuit breaker rejected part of the lookup")
+    if not found and not client.available:
+        # Every term failed and tripped the breaker; don't report "not offered"
+        raise CircuitOpenError("FOSE unavailable")
+    
+    # Most recent terms first, as the snapshot path reports them
+    recent = sorted(found, reverse=True)[:MAX_SEMESTERS]
+    professors = set()
+    for term in recent:
+        for r in found[term]:
+            professors.update(split_instructors(r.get("instr", "")))
+    semesters = [term_name(t) for t in recent]
+    return build_details_payload(professors, semesters, details_prerequisites(found_description))
+
+def build_details_payload(professors, semesters, prerequisites: str) -> dict:
+    """Shape scraped (or snapshotted) FOSE data into the /course/{code}/details payload."""
     return {
         "professors": list(professors) if professors else ["TBD - Consult Department"],
-        "available_semesters": list(found_semesters)[:3] if found_semesters else ["Check NYU Albert"],
-        "prerequisites": html.unescape(prereqs) if prereqs else "None",
+        "available_semesters": semesters[:MAX_SEMESTERS] if semesters else ["Check NYU Albert"],
+        "prerequisites": prerequisites or "None",
         "live_status": "Department Listed"
     }
-
@@ -1,15 +1,37 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional, Union
+import asyncio
+import base64
+import binascii
+import hashlib
 import json
+import logging
 import redis.asyncio as redis
 from sqlalchemy.future import select
-from sentence_transformers import SentenceTransformer
 import aiohttp
-from backend.database import AsyncSessionLocal, Course, SavedCourse
+from backend.database import AsyncSessionLocal, Course, SavedCourse, MODEL_EMBEDDING_DIM, engine
+from backend.model_loader import ModelLoader
+from backend.embedding_server import EmbeddingServerError
+from backend.embedding_cache import QueryEmbeddingCache, normalize_query
+from backend.result_cache import SearchResultCache
+from backend.vector_index import apply_search_settings, vector_search, MAX_EF_SEARCH, MAX_PROBES
+from backend.quantization import truncate_embeddings
+from backend.vector_store import VectorStore
+from backend.fose_client import FoseClient, CircuitOpenError
+from backend.details_cache import CourseDetailsCache, DETAILS_SOFT_TTL
+from backend.fose_snapshot import details_sources
+from backend.lexical_search import code_lookup, lexical_search, reciprocal_rank_fusion
+from backend.search_filters import filter_clauses, normalize_school
+from backend.prereq_graph import PrerequisiteGraph
+from backend.planner import PlannerCache, add_courses, remove_courses
+from backend.metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, app_stats, render_metrics, stage
 import os
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="NYU Course Search API")
 
 app.add_middleware(
@@ -18,26 +40,98 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
+# Per-route latency histograms and a Server-Timing header on every response
+app.add_middleware(MetricsMiddleware)
 
 # Redis configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+# Separate client for packed binary values (query embeddings)
+redis_bytes_client = redis.from_url(REDIS_URL, decode_responses=False)
 
 # Load Embedding model
 MODEL_NAME = "nomic-ai/nomic-embed-text-v1.5"
-model = None
+# Nomic expects "search_query: " prefix for searching
+QUERY_PREFIX = "search_query: "
+# Loaded in the background (or reached at EMBED_SERVER_URL); /health/ready reports when search can use it
+model_loader = ModelLoader(MODEL_NAME, f"{QUERY_PREFIX}warm up")
+query_cache = QueryEmbeddingCache(redis_bytes_client, MODEL_NAME, QUERY_PREFIX)
+result_cache = SearchResultCache(redis_client)
+planner_cache = PlannerCache(redis_client, result_cache.generation)
+
+# "pgvector" (default) or "numpy" for the in-process memory-mapped vector store
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "pgvector").lower()
+vector_store = VectorStore()
+
+# Fuse Postgres full-text results with vector results (reciprocal-rank fusion)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+# Candidates pulled from each retriever before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+# Results ranked (and cached) per search, so following pages come from the cache
+SEARCH_PREFETCH = int(os.getenv("SEARCH_PREFETCH", "50"))
+# Deepest result a cursor may page to
+MAX_SEARCH_OFFSET = int(os.getenv("MAX_SEARCH_OFFSET", "500"))
+# Description snippet length for fields="compact"
+SNIPPET_CHARS = int(os.getenv("SNIPPET_CHARS", "160"))
+
+# Prerequisite DAG served from memory; rebuilt when populate.py bumps the catalog generation
+prereq_graph = PrerequisiteGraph()
+
+# One pooled client for every FOSE call, opened/closed with the app
+fose_client = FoseClient()
+# Served (and cached briefly) while the FOSE circuit breaker is open
+FOSE_FALLBACK_TTL = 300
+FOSE_FALLBACK_DETAILS = {
+    "professors": ["TBD - Consult Department"],
+    "available_semesters": ["Check NYU Albert"],
+    "prerequisites": "None",
+    "live_status": "Live data unavailable",
+}
 
 @app.on_event("startup")
 async def startup_event():
-    global model
-    # Load model on startup to avoid lag on first request
-    # Use general document prefix or search query prefix as specified by Nomic
-    model = SentenceTransformer(MODEL_NAME, trust_remote_code=True)
+    await fose_client.start()
+
+    # Loading the model takes seconds; everything except uncached searches serves meanwhile
+    model_loader.start()
+
+    if SEARCH_BACKEND == "numpy":
+        if not vector_store.load():
+            logger.warning(f"Vector store {vector_store.vectors_path} not found; falling back to pgvector until it appears")
+        vector_store.start_watching()
+
+    try:
+        await prereq_graph.refresh(redis_client, force=True)
+    except Exception as e:
+        logger.warning(f"Prerequisite graph not loaded yet (run populate.py): {e}")
+    prereq_graph.start_watching(redis_client)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await model_loader.stop()
+    await vector_store.stop_watching()
+    await prereq_graph.stop_watching()
+    await fose_client.close()
 
 class SearchQuery(BaseModel):
     query: str
-    top_k: int = 20
+    top_k: int = Field(default=20, ge=1, le=100)
+    # ANN recall knobs; None uses the server defaults (HNSW_EF_SEARCH / IVFFLAT_PROBES)
+    ef_search: Optional[int] = Field(default=None, ge=1, le=MAX_EF_SEARCH)
+    probes: Optional[int] = Field(default=None, ge=1, le=MAX_PROBES)
+    # Filters are applied inside the retrieval queries, so top_k is still filled
+    subject: Optional[str] = None
+    school: Optional[str] = Field(default=None, description='School suffix of the course code, e.g. "UA" or "-GB"')
+    has_prereqs: Optional[bool] = None
+    # "compact" drops the description for a short snippet; GET /course/{code} has the full record
+    fields: Literal["full", "compact"] = "full"
+    # Opaque value from the previous page's X-Next-Cursor header
+    cursor: Optional[str] = None
+
+    def filters(self) -> dict:
+        return {"subject": self.subject, "school": normalize_school(self.school), "has_prereqs": self.has_prereqs}
 
 class CourseResult(BaseModel):
     code: str
@@ -46,70 +140,331 @@ class CourseResult(BaseModel):
     description: Optional[str]
     similarity: float
 
-@app.post("/search", response_model=List[CourseResult])
-async def search_courses(request: SearchQuery):
-    global model
-    if not model:
-        raise HTTPException(status_code=500, detail="Model not loaded")
-        
-    # Nomic expects "search_query: " prefix for searching
-    embedded_query = model.encode([f"search_query: {request.query}"], convert_to_tensor=False)[0]
-    
+class CourseSummary(BaseModel):
+    code: str
+    name: str
+    subject: Optional[str]
+    snippet: Optional[str]
+    similarity: float
+
+def _course_result(course, similarity: float) -> dict:
+    # Plain dicts: results are cached as JSON and serialized with orjson, so a
+    # pydantic model per row would only be built to be dumped again
+    return {
+        "code": course.code,
+        "name": course.name,
+        "subject": course.subject,
+        "description": course.description,
+        "similarity": similarity,
+    }
+
+def _snippet(description: Optional[str], limit: int = SNIPPET_CHARS) -> Optional[str]:
+    if not description or len(description) <= limit:
+        return description
+    cut = description[:limit]
+    # Break on a word boundary unless that throws away most of the snippet
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,;:.") + "\u2026"
+
+def _project(results: List[dict], fields: str) -> List[dict]:
+    if fields == "full":
+        return results
+    return [
+        {
+            "code": r["code"],
+            "name": r["name"],
+            "subject": r["subject"],
+            "snippet": _snippet(r["description"]),
+            "similarity": r["similarity"],
+        }
+        for r in results
+    ]
+
+def _cursor_scope(query: str, variant: str) -> str:
+    # Ties a cursor to the query and settings that produced the first page
+    return hashlib.sha1(f"{normalize_query(query)}\0{variant}".encode()).hexdigest()[:16]
+
+def _encode_cursor(offset: int, scope: str) -> str:
+    raw = json.dumps({"o": offset, "s": scope}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, scope: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        offset = int(payload["o"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if payload.get("s") != scope:
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this search")
+    if not 0 <= offset <= MAX_SEARCH_OFFSET:
+        raise HTTPException(status_code=400, detail="Cursor offset out of range")
+    return offset
+
+async def _search_pgvector(embedded_query, request: SearchQuery, limit: int) -> List[dict]:
+    clauses = filter_clauses(**request.filters())
     async with AsyncSessionLocal() as session:
+        await apply_search_settings(session, request.ef_search, request.probes, filtered=bool(clauses), limit=limit)
         # Cosine distance ordering using pgvector (<=>)
-        # Higher similarity = lower distance
-        stmt = select(
-            Course,
-            Course.embedding.cosine_distance(embedded_query.tolist()).label("distance")
-        ).order_by("distance").limit(request.top_k)
+        # Higher similarity = lower distance. Only the returned columns are
+        # selected so the embedding doesn't travel back per row.
+        stmt = vector_search(embedded_query, limit, clauses)
         
         result = await session.execute(stmt)
-        
-        results = []
-        for course, distance in result.all():
-            results.append(CourseResult(
-                code=course.code,
-                name=course.name,
-                subject=course.subject,
-                description=course.description,
-                similarity=1 - distance # Convert distance to similarity
-            ))
-            
+        # Convert distance to similarity
+        results = [_course_result(row, 1 - row.distance) for row in result.all()]
+        if clauses:
+            # Relaxed-order iterative scans may return rows slightly out of order
+            results.sort(key=lambda r: r["similarity"], reverse=True)
         return results
 
-@app.get("/course/{course_code}/details")
-async def get_course_details(course_code: str):
+async def _search_vector_store(embedded_query, request: SearchQuery, limit: int) -> List[dict]:
+    # The matrix-vector product releases the GIL, so keep it off the event loop
+    hits = await asyncio.to_thread(vector_store.search, embedded_query, limit, **request.filters())
+    return [{**meta, "similarity": similarity} for meta, similarity in hits]
+
+async def _search_lexical(request: SearchQuery, limit: int) -> list:
+    async with AsyncSessionLocal() as session:
+        return await lexical_search(session, request.query, limit, filter_clauses(**request.filters()))
+
+async def _similarities(codes: List[str], db_query) -> dict:
+    """Cosine similarity to the query for courses the vector pass didn't return, computed in Postgres."""
+    if not codes:
+        return {}
+    distance = Course.embedding.cosine_distance(list(map(float, db_query)))
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Course.code, distance).where(Course.code.in_(codes), Course.embedding.isnot(None))
+        )
+        return {code: 1 - dist for code, dist in result.all()}
+
+async def _embed_query(query: str):
+    with stage("query_cache"):
+        embedded_query = await query_cache.get(query)
+    if embedded_query is None:
+        if not model_loader.ready:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Model {model_loader.state}",
+                headers={"Retry-After": "5"},
+            )
+        try:
+            with stage("embed"):
+                embedded_query = await model_loader.encoder.encode(f"{QUERY_PREFIX}{normalize_query(query)}")
+        except EmbeddingServerError as e:
+            logger.error(f"Embedding server unavailable: {e}")
+            raise HTTPException(status_code=503, detail="Embedding server unavailable", headers={"Retry-After": "5"})
+        embedded_query = await query_cache.set(query, embedded_query)
+    return embedded_query
+
+@app.post("/search", response_model=List[Union[CourseResult, CourseSummary]], response_class=ORJSONResponse)
+async def search_courses(request: SearchQuery):
     """
-    Dynamically fetches course details (like professors, schedule, prereqs) using the NYU Class Search beta.
-    Uses Redis to cache results for 1 day to prevent rate limiting.
+    Semantic (optionally hybrid) course search. Pages are continued by passing the
+    X-Next-Cursor response header back as `cursor`; each search ranks and caches
+    SEARCH_PREFETCH results, so following pages skip the model entirely.
     """
-    cache_key = f"course_details:{course_code}"
-    cached = await redis_client.get(cache_key)
-    
-    if cached:
-        return json.loads(cached)
+    # pgvector stays the fallback until a vector store file has been loaded
+    use_vector_store = SEARCH_BACKEND == "numpy" and vector_store.ready
+    cache_variant = "numpy" if use_vector_store else f"ef={request.ef_search}:probes={request.probes}"
+    if HYBRID_SEARCH:
+        cache_variant += ":hybrid"
+    cache_variant += ":" + json.dumps(request.filters(), sort_keys=True)
+
+    scope = _cursor_scope(request.query, cache_variant)
+    offset = _decode_cursor(request.cursor, scope) if request.cursor else 0
+    # One extra row tells us whether there is a next page
+    wanted = offset + request.top_k + 1
+
+    def respond(ranked: List[dict]) -> ORJSONResponse:
+        page = ranked[offset:offset + request.top_k]
+        headers = {}
+        if len(ranked) >= wanted and offset + request.top_k <= MAX_SEARCH_OFFSET:
+            headers["X-Next-Cursor"] = _encode_cursor(offset + request.top_k, scope)
+        with stage("serialize"):
+            return ORJSONResponse(_project(page, request.fields), headers=headers)
+
+    with stage("cache"):
+        cached_results = await result_cache.get(request.query, wanted, cache_variant)
+    if cached_results is not None:
+        return respond(cached_results)
+
+    # Rank past the requested page so the next one is a cache hit
+    depth = max(wanted, SEARCH_PREFETCH, HYBRID_CANDIDATES if HYBRID_SEARCH else 0)
+
+    # Course-code queries ("CSCI-UA 102") are answered by an index lookup without the model
+    with stage("code_lookup"):
+        async with AsyncSessionLocal() as session:
+            exact = await code_lookup(session, request.query, depth, filter_clauses(**request.filters()))
+    if exact:
+        results = [_course_result(course, 1.0) for course in exact]
+        await result_cache.set(request.query, depth, results, cache_variant)
+        return respond(results)
+
+    lexical_task = None
+    if HYBRID_SEARCH:
+        # Full-text retrieval runs while the query is being embedded
+        async def timed_lexical():
+            with stage("lexical"):
+                try:
+                    return await _search_lexical(request, depth)
+                except Exception as e:
+                    # Degrade to vector-only results rather than failing the search
+                    logger.error(f"Lexical search failed for {request.query!r}: {e}")
+                    return []
+        lexical_task = asyncio.create_task(timed_lexical())
+
+    try:
+        embedded_query = await _embed_query(request.query)
         
-    import re
+        # Full-width normalized query; pgvector and the vector store truncate it
+        # themselves for a Matryoshka-truncated first pass
+        db_query = truncate_embeddings(embedded_query, MODEL_EMBEDDING_DIM)
+        with stage("vector"):
+            if use_vector_store:
+                vector_results = await _search_vector_store(embedded_query, request, depth)
+            else:
+                vector_results = await _search_pgvector(db_query, request, depth)
+
+        lexical_rows = await lexical_task if lexical_task is not None else []
+    finally:
+        if lexical_task is not None and not lexical_task.done():
+            lexical_task.cancel()
+
+    if lexical_rows:
+        with stage("fusion"):
+            by_code = {r["code"]: r for r in vector_results}
+            similarities = await _similarities([c.code for c in lexical_rows if c.code not in by_code], db_query)
+            for course in lexical_rows:
+                if course.code in similarities:
+                    by_code[course.code] = _course_result(course, similarities[course.code])
+            fused = reciprocal_rank_fusion([[r["code"] for r in vector_results], [c.code for c in lexical_rows]])
+            results = [by_code[code] for code, _ in fused if code in by_code][:depth]
+    else:
+        results = vector_results[:depth]
+
+    await result_cache.set(request.query, depth, results, cache_variant)
+    return respond(results)
+
+@app.get("/course/{course_code}", response_model=CourseResult)
+async def get_course(course_code: str):
+    """Full catalog record for one course, e.g. to expand a compact search result."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Course.code, Course.name, Course.subject, Course.description).where(Course.code == course_code)
+        )
+        row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return ORJSONResponse(_course_result(row, 1.0))
+
+_NOT_LOADED = object()
+
+async def load_course_details(course_code: str, snapshot=_NOT_LOADED, catalog_prereqs=_NOT_LOADED):
+    """
+    Build the details payload for one course. The local FOSE term snapshot is
+    tried first; live FOSE scraping is the fallback for courses missing from it.
+    Prerequisites fall back to the text populate.py parsed from the catalog
+    description. Returns (payload, soft TTL). Batch callers pass the snapshot
+    payload and catalog prerequisites they already fetched.
+    """
     from backend.live_scraper import fetch_live_course_details
 
-    # 1. Fetch live data from FOSE
-    live_data = await fetch_live_course_details(course_code)
+    ttl = DETAILS_SOFT_TTL
+    if snapshot is _NOT_LOADED:
+        with stage("details_db"):
+            async with AsyncSessionLocal() as session:
+                snapshots, prereqs = await details_sources(session, [course_code])
+        snapshot, catalog_prereqs = snapshots.get(course_code), prereqs.get(course_code)
+
+    if snapshot is not None:
+        # 1a. Served from the term snapshot with a single indexed lookup
+        live_data = dict(snapshot)
+    else:
+        # 1b. Fetch live data from FOSE
+        try:
+            with stage("fose"):
+                live_data = await fetch_live_course_details(course_code, fose_client)
+        except CircuitOpenError:
+            # FOSE is down: answer from the catalog now and retry live data soon
+            live_data = dict(FOSE_FALLBACK_DETAILS)
+            ttl = FOSE_FALLBACK_TTL
     
     # 2. Add course code to payload
     live_data["course_code"] = course_code
     
-    # 3. If PREREQS were not found in the live FOSE data, fallback to mapping from the database course description
-    if live_data["prerequisites"] == "None":
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(select(Course).where(Course.code == course_code))
-            course = result.scalar_one_or_none()
-            if course and course.description:
-                match = re.search(r'Prerequisite[s]?:?\s*(.*?)(?=\. [A-Z]|$)', course.description, re.IGNORECASE)
-                if match:
-                    live_data["prerequisites"] = match.group(1).strip()
+    # 3. If PREREQS were not found in the FOSE data, fallback to the catalog's (parsed at populate time)
+    if live_data["prerequisites"] == "None" and catalog_prereqs:
+        live_data["prerequisites"] = catalog_prereqs
     
-    await redis_client.setex(cache_key, 86400, json.dumps(live_data))
-    return live_data
+    return live_data, ttl
+
+details_cache = CourseDetailsCache(redis_client, load_course_details)
+
+# Component counters are read when /metrics is scraped, not on the request path
+app_stats.caches.update({
+    "query_embedding": query_cache,
+    "search_result": result_cache,
+    "course_details": details_cache,
+    "planner": planner_cache,
+})
+app_stats.fose = fose_client
+app_stats.encoder = lambda: model_loader.encoder
+app_stats.pool = engine.pool
+
+@app.get("/course/{course_code}/details")
+async def get_course_details(course_code: str):
+    """
+    Dynamically fetches course details (like professors, schedule, prereqs) using the NYU Class Search beta.
+    Results are cached in Redis for 1 day to prevent rate limiting; after that the stale copy is
+    served while a single background scrape refreshes it.
+    """
+    return await details_cache.get(course_code)
+
+@app.get("/course/{course_code}/prerequisites")
+async def get_course_prerequisites(course_code: str):
+    """
+    Every course to take before this one, prerequisites first, from the in-memory
+    prerequisite graph. Each entry lists its own direct prerequisites.
+    """
+    if not prereq_graph.ready:
+        raise HTTPException(status_code=503, detail="Prerequisite graph not loaded")
+    return prereq_graph.course_chain(course_code)
+
+MAX_BATCH_DETAILS = 100
+BATCH_DETAILS_CONCURRENCY = 8
+
+class BatchDetailsRequest(BaseModel):
+    course_codes: List[str] = Field(..., max_length=MAX_BATCH_DETAILS)
+
+@app.post("/course/details/batch")
+async def get_course_details_batch(request: BatchDetailsRequest):
+    """
+    Details for many courses in one call. Cache hits are resolved with a single
+    MGET; misses share one snapshot and prerequisite query, and anything not
+    in the snapshot is scraped concurrently.
+    Each entry carries its own status, so one failing course doesn't fail the batch.
+    """
+    codes = list(dict.fromkeys(request.course_codes))
+    cached = await details_cache.read_many(codes)
+    missing = [code for code in codes if code not in cached]
+
+    snapshots, prereqs = {}, {}
+    if missing:
+        with stage("details_db"):
+            async with AsyncSessionLocal() as session:
+                snapshots, prereqs = await details_sources(session, missing)
+
+    async def loader(code: str):
+        return await load_course_details(code, snapshots.get(code), prereqs.get(code))
+
+    resolved = await details_cache.get_many(codes, loader, BATCH_DETAILS_CONCURRENCY, cached=cached)
+    return [
+        {"course_code": code, "status": resolved[code][0], "details": resolved[code][1]}
+        for code in request.course_codes
+    ]
 
 @app.post("/search/feedback")
 async def submit_feedback(course_code: str, query: str, thumbs_up: bool):
@@ -124,55 +479,130 @@ class SaveCourseRequest(BaseModel):
     user_id: str
     course_code: str
 
+MAX_PLANNER_BATCH = 100
+
+class BatchSaveRequest(BaseModel):
+    user_id: str
+    course_codes: List[str] = Field(..., min_length=1, max_length=MAX_PLANNER_BATCH)
+
+async def _write_planner(write, user_id: str, course_codes: List[str]) -> dict:
+    with stage("db"):
+        async with AsyncSessionLocal() as session:
+            statuses = await write(session, user_id, course_codes)
+    if any(status in ("added", "removed") for status in statuses.values()):
+        await planner_cache.invalidate(user_id)
+    return statuses
+
 @app.post("/planner/add")
 async def add_to_planner(request: SaveCourseRequest):
-    async with AsyncSessionLocal() as session:
-        stmt = select(SavedCourse).where(
-            SavedCourse.user_id == request.user_id,
-            SavedCourse.course_code == request.course_code
-        )
-        result = await session.execute(stmt)
-        if result.scalar_one_or_none():
-            return {"status": "already saved"}
-            
-        saved = SavedCourse(user_id=request.user_id, course_code=request.course_code)
-        session.add(saved)
-        await session.commit()
-        return {"status": "success"}
+    status = (await _write_planner(add_courses, request.user_id, [request.course_code]))[request.course_code]
+    if status == "not found":
+        raise HTTPException(status_code=404, detail="Course not found")
+    return {"status": "success" if status == "added" else status}
 
 @app.post("/planner/remove")
 async def remove_from_planner(request: SaveCourseRequest):
-    async with AsyncSessionLocal() as session:
-        stmt = select(SavedCourse).where(
-            SavedCourse.user_id == request.user_id,
-            SavedCourse.course_code == request.course_code
-        )
-        result = await session.execute(stmt)
-        existing = result.scalar_one_or_none()
-        if existing:
-            await session.delete(existing)
-            await session.commit()
-            return {"status": "removed"}
-        return {"status": "not found"}
-
-@app.get("/planner/{user_id}", response_model=List[CourseResult])
+    return {"status": (await _write_planner(remove_courses, request.user_id, [request.course_code]))[request.course_code]}
+
+@app.post("/planner/add/batch")
+async def add_many_to_planner(request: BatchSaveRequest):
+    """Save many courses in one statement. Each code reports "added", "already saved" or "not found"."""
+    statuses = await _write_planner(add_courses, request.user_id, request.course_codes)
+    return [{"course_code": code, "status": status} for code, status in statuses.items()]
+
+@app.post("/planner/remove/batch")
+async def remove_many_from_planner(request: BatchSaveRequest):
+    """Unsave many courses in one statement. Each code reports "removed" or "not found"."""
+    statuses = await _write_planner(remove_courses, request.user_id, request.course_codes)
+    return [{"course_code": code, "status": status} for code, status in statuses.items()]
+
+async def _planner_courses(user_id: str) -> List[dict]:
+    with stage("cache"):
+        key = await planner_cache.key(user_id)
+        cached = await planner_cache.get(key)
+    if cached is not None:
+        return cached
+    with stage("db"):
+        async with AsyncSessionLocal() as session:
+            stmt = select(
+                Course.code, Course.name, Course.subject, Course.description
+            ).join(SavedCourse, Course.code == SavedCourse.course_code).where(SavedCourse.user_id == user_id).order_by(SavedCourse.saved_at.desc())
+            
+            result = await session.execute(stmt)
+            courses = [_course_result(row, 1.0) for row in result.all()]
+    await planner_cache.set(key, courses)
+    return courses
+
+@app.get("/planner/{user_id}", response_model=List[CourseResult], response_class=ORJSONResponse)
 async def get_planner(user_id: str):
-    async with AsyncSessionLocal() as session:
-        stmt = select(Course).join(SavedCourse, Course.code == SavedCourse.course_code).where(SavedCourse.user_id == user_id).order_by(SavedCourse.saved_at.desc())
-        
-        result = await session.execute(stmt)
-        courses = result.scalars().all()
-        
-        return [
-            CourseResult(
-                code=c.code,
-                name=c.name,
-                subject=c.subject,
-                description=c.description,
-                similarity=1.0
-            ) for c in courses
-        ]
+    """Saved courses, newest first. Cached per user until their next planner write."""
+    return ORJSONResponse(await _planner_courses(user_id))
+
+@app.get("/planner/{user_id}/prerequisites")
+async def get_planner_prerequisites(user_id: str):
+    """
+    The combined prerequisite chain for every saved course, in a valid order to
+    take them, plus the prerequisites that aren't in the plan yet.
+    """
+    if not prereq_graph.ready:
+        raise HTTPException(status_code=503, detail="Prerequisite graph not loaded")
+    codes = [course["code"] for course in await _planner_courses(user_id)]
+    return prereq_graph.plan_chain(codes)
 
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
+    """Liveness: the process is up. Fails only if the model can never load, so a restart is the fix."""
+    if model_loader.failed:
+        return ORJSONResponse({"status": "failed", "model": model_loader.status()}, status_code=503)
     return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: the query model is loaded and warm, so /search can take traffic."""
+    status = model_loader.status()
+    if not model_loader.ready:
+        return ORJSONResponse({"status": "not ready", "model": status}, status_code=503)
+    return {"status": "ready", "model": status}
+
+@app.get("/stats/embedder")
+async def embedder_stats():
+    """Queue depth and batch-size metrics for the query encoder."""
+    if not model_loader.ready:
+        raise HTTPException(status_code=503, detail=f"Model {model_loader.state}")
+    return {**model_loader.encoder.stats(), "model": model_loader.status()}
+
+@app.get("/stats/query-cache")
+async def query_cache_stats():
+    """Hit/miss counters for the two-tier query embedding cache."""
+    return query_cache.stats()
+
+@app.get("/stats/result-cache")
+async def result_cache_stats():
+    """Hit/miss counters and current catalog generation for the /search result cache."""
+    return result_cache.stats()
+
+@app.get("/stats/fose")
+async def fose_stats():
+    """Request/retry counters and circuit breaker state for the FOSE client."""
+    return fose_client.stats()
+
+@app.get("/stats/details-cache")
+async def details_cache_stats():
+    """Fresh/stale hit counters and coalesced loads for /course/{code}/details."""
+    return details_cache.stats()
+
+@app.get("/stats/prereq-graph")
+async def prereq_graph_stats():
+    """Size, last rebuild cost and detected cycles of the prerequisite graph."""
+    return prereq_graph.stats()
+
+@app.get("/stats/planner-cache")
+async def planner_cache_stats():
+    """Hit/miss and invalidation counters for the per-user /planner cache."""
+    return planner_cache.stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: request/stage latency histograms, cache hit counters, FOSE errors, DB pool."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,179 @@
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# 1ms .. 10s; stage and request latencies both fall in this range
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = Histogram(
+    "course_api_request_seconds", "Request latency by route and status",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "course_api_stage_seconds", "Time spent in one stage of a request (embed, vector, fose, ...)",
+    ["route", "stage"], buckets=LATENCY_BUCKETS,
+)
+FOSE_ERRORS = Counter(
+    "course_api_fose_errors_total", "FOSE calls that failed after retries, by term and FOSE route",
+    ["term", "route"],
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "course_api_db_pool_wait_seconds", "Time to check a connection out of the SQLAlchemy pool (including connecting)",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+# Cache stats() key -> result label, per cache
+CACHE_RESULTS = {
+    "query_embedding": {"local_hits": "local_hit", "redis_hits": "redis_hit", "misses": "miss"},
+    "search_result": {"hits": "hit", "misses": "miss"},
+    "course_details": {"fresh_hits": "fresh_hit", "stale_hits": "stale_hit", "misses": "miss"},
+    "planner": {"hits": "hit", "misses": "miss"},
+}
+
+_timings: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Stage durations for one request; rendered as its Server-Timing header."""
+
+    __slots__ = ("scope", "stages")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.stages: Dict[str, float] = {}
+
+    @property
+    def route(self) -> str:
+        # Set by the router once the request is matched; the template keeps label cardinality bounded
+        route = self.scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def header(self, total: float) -> str:
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def record_stage(stage: str, seconds: float):
+    timings = _timings.get()
+    STAGE_SECONDS.labels(timings.route if timings is not None else "background", stage).observe(seconds)
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as one stage of the current request (histogram + Server-Timing). Repeats add up."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware: per-route latency histogram and a Server-Timing header
+    listing every stage() the request went through, plus the total.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings(scope)
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.header(time.perf_counter() - start).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            REQUEST_SECONDS.labels(scope["method"], timings.route, str(status)).observe(time.perf_counter() - start)
+
+
+class AppStatsCollector:
+    """
+    Exposes the counters the app's components already keep (cache hits, encoder
+    batches, FOSE retries, pool usage) when /metrics is scraped, so the request
+    path pays nothing for them.
+    """
+
+    def __init__(self):
+        self.caches: Dict[str, object] = {}
+        self.fose = None
+        self.encoder: Optional[Callable[[], object]] = None
+        self.pool = None
+
+    def collect(self):
+        lookups = CounterMetricFamily("course_api_cache_lookups", "Cache lookups by cache and result", labels=["cache", "result"])
+        errors = CounterMetricFamily("course_api_cache_errors", "Redis errors seen by each cache", labels=["cache"])
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            for key, result in CACHE_RESULTS[name].items():
+                lookups.add_metric([name, result], stats[key])
+            errors.add_metric([name], stats.get("errors", stats.get("redis_errors", 0)))
+        yield lookups
+        yield errors
+
+        if self.fose is not None:
+            stats = self.fose.stats()
+            for key in ("requests", "retries", "failures", "rejected"):
+                yield CounterMetricFamily(f"course_api_fose_{key}", f"FOSE client {key}", value=stats[f"{key}_total"])
+            yield GaugeMetricFamily("course_api_fose_breaker_open", "1 while the FOSE circuit breaker is open",
+                                    value=1 if stats["breaker_state"] == "open" else 0)
+
+        encoder = self.encoder() if self.encoder is not None else None
+        if encoder is not None:
+            stats = encoder.stats()
+            yield CounterMetricFamily("course_api_embed_requests", "Queries sent to the encoder", value=stats["requests_total"])
+            if "batches_total" in stats:
+                yield CounterMetricFamily("course_api_embed_batches", "Encoder forward passes", value=stats["batches_total"])
+                yield GaugeMetricFamily("course_api_embed_queue_depth", "Queries waiting for a batch", value=stats["queue_depth"])
+
+        if self.pool is not None:
+            yield GaugeMetricFamily("course_api_db_pool_checked_out", "Connections in use", value=self.pool.checkedout())
+            yield GaugeMetricFamily("course_api_db_pool_size", "Connections kept open by the pool", value=self.pool.size())
+            yield GaugeMetricFamily("course_api_db_pool_overflow", "Connections above the pool size", value=max(self.pool.overflow(), 0))
+
+
+app_stats = AppStatsCollector()
+REGISTRY.register(app_stats)
+
+
+def render_metrics() -> bytes:
+    """
+    Prometheus text exposition. With PROMETHEUS_MULTIPROC_DIR set (several uvicorn
+    workers), histograms and counters are merged across workers; app_stats
+    always describes the worker that answered the scrape.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(app_stats)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
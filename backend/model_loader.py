@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from backend.embedder import BatchingEncoder
+from backend.embedding_server import EMBED_SERVER_URL, EmbeddingClient
+
+logger = logging.getLogger(__name__)
+
+# "torch" (default) or "onnx" for ONNX Runtime on CPU
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+# ONNX graph inside the model repo (or ONNX_MODEL_PATH). The nomic repo ships
+# onnx/model.onnx and the int8 onnx/model_quantized.onnx.
+ONNX_FILE = os.getenv("ONNX_FILE", "onnx/model_quantized.onnx")
+# Local directory written by `python -m backend.model_loader export`; defaults to the hub model
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH")
+# Intra-op threads for inference; 0 keeps the library default (all cores)
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+
+BACKENDS = ("torch", "onnx")
+# Delay between attempts to reach an embedding server that isn't up yet
+SERVER_RETRY_SECONDS = 2.0
+
+
+def load_model(model_name: str, backend: str = EMBED_BACKEND, threads: int = EMBED_THREADS):
+    """A SentenceTransformer on the requested inference backend. Blocking; run it off the event loop."""
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"EMBED_BACKEND must be one of {BACKENDS}, got {backend!r}")
+
+    if backend == "onnx":
+        import onnxruntime
+
+        session_options = onnxruntime.SessionOptions()
+        if threads:
+            session_options.intra_op_num_threads = threads
+        return SentenceTransformer(
+            ONNX_MODEL_PATH or model_name,
+            backend="onnx",
+            trust_remote_code=True,
+            model_kwargs={
+                "file_name": ONNX_FILE,
+                "provider": "CPUExecutionProvider",
+                "session_options": session_options,
+            },
+        )
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    return SentenceTransformer(model_name, trust_remote_code=True)
+
+
+class ModelLoader:
+    """
+    Loads the query model in a background thread so the app starts serving the
+    routes that don't need it (planner, details, code lookups) immediately.
+    `encoder` stays None until the model has loaded and answered a warm-up query.
+
+    With `server_url` set, no model is loaded here: `encoder` is an
+    EmbeddingClient, ready once the shared embedding server answers.
+    """
+
+    def __init__(self, model_name: str, warmup_text: str, backend: str = EMBED_BACKEND, threads: int = EMBED_THREADS,
+                 server_url: Optional[str] = EMBED_SERVER_URL):
+        self.model_name = model_name
+        self.warmup_text = warmup_text
+        self.backend = "remote" if server_url else backend
+        self.threads = threads
+        self.server_url = server_url
+
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.encoder = None
+        self._task: Optional[asyncio.Task] = None
+        self._started = time.monotonic()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def failed(self) -> bool:
+        return self.state == "failed"
+
+    def start(self):
+        if self._task is None:
+            self._started = time.monotonic()
+            self._task = asyncio.create_task(self._connect() if self.server_url else self._load())
+
+    async def _connect(self):
+        self.state = "loading"
+        start = time.perf_counter()
+        client = EmbeddingClient(self.server_url)
+        await client.start()
+        # The server may still be loading its own model; keep trying rather than fail
+        attempts = 0
+        try:
+            while True:
+                try:
+                    await client.encode(self.warmup_text)
+                    break
+                except Exception as e:
+                    attempts += 1
+                    self.error = str(e)
+                    if attempts == 1 or attempts % 30 == 0:
+                        logger.warning(f"Embedding server {self.server_url} not ready: {e}")
+                    await asyncio.sleep(SERVER_RETRY_SECONDS)
+        except asyncio.CancelledError:
+            await client.stop()
+            raise
+        self.encoder = client
+        self.error = None
+        self.load_seconds = time.perf_counter() - start
+        self.state = "ready"
+        logger.info(f"Using embedding server {self.server_url} (ready after {self.load_seconds:.1f}s)")
+
+    async def _load(self):
+        self.state = "loading"
+        start = time.perf_counter()
+        encoder = None
+        try:
+            model = await asyncio.to_thread(load_model, self.model_name, self.backend, self.threads)
+            encoder = BatchingEncoder(model)
+            await encoder.start()
+            # The first forward pass allocates buffers; pay for it before taking traffic
+            await encoder.encode(self.warmup_text)
+        except Exception as e:
+            if encoder is not None:
+                await encoder.stop()
+            self.state = "failed"
+            self.error = str(e)
+            logger.exception(f"Loading {self.model_name} ({self.backend}) failed")
+            return
+        self.encoder = encoder
+        self.load_seconds = time.perf_counter() - start
+        self.state = "ready"
+        logger.info(f"Loaded {self.model_name} ({self.backend}, threads={self.threads or 'default'}) in {self.load_seconds:.1f}s")
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.encoder is not None:
+            await self.encoder.stop()
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "model": self.model_name,
+            "backend": self.backend,
+            "threads": self.threads or None,
+            "server": self.server_url,
+            "load_seconds": self.load_seconds,
+            "waited_seconds": None if self.ready else time.monotonic() - self._started,
+            "error": self.error,
+        }
+
+
+def export_onnx(model_name: str, output: str, quantize: str):
+    """Export the model to ONNX (plus a dynamically int8-quantized copy) for EMBED_BACKEND=onnx."""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    start = time.perf_counter()
+    model = SentenceTransformer(model_name, backend="onnx", trust_remote_code=True)
+    model.save_pretrained(output)
+    onnx_file = "onnx/model.onnx"
+    if quantize:
+        # Written as onnx/model_quantized.onnx, the ONNX_FILE default, so
+        # ONNX_MODEL_PATH=<output> is all the loader needs
+        export_dynamic_quantized_onnx_model(model, quantize, output, file_suffix="quantized")
+        onnx_file = "onnx/model_quantized.onnx"
+    logger.info(
+        f"Exported {model_name} to {output} in {time.perf_counter() - start:.1f}s; "
+        f"load it with ONNX_MODEL_PATH={output}" + ("" if onnx_file == ONNX_FILE else f" ONNX_FILE={onnx_file}")
+    )
+
+
+def benchmark(model_name: str, backend: str, threads: int, queries: int):
+    start = time.perf_counter()
+    model = load_model(model_name, backend, threads)
+    loaded = time.perf_counter() - start
+    latencies = []
+    for i in range(queries + 1):
+        start = time.perf_counter()
+        model.encode([f"search_query: intro course number {i}"], convert_to_tensor=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+    # The first call includes one-off allocation
+    latencies = sorted(latencies[1:])
+    logger.info(
+        f"{backend} threads={threads or 'default'}: load {loaded:.1f}s, "
+        f"encode p50 {latencies[len(latencies) // 2]:.1f}ms p95 {latencies[int(len(latencies) * 0.95)]:.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export or benchmark the query model's inference backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="write an ONNX copy of the model for EMBED_BACKEND=onnx")
+    export.add_argument("--model", default="nomic-ai/nomic-embed-text-v1.5")
+    export.add_argument("--output", default="models/nomic-onnx")
+    export.add_argument("--quantize", default="avx2", choices=["", "arm64", "avx2", "avx512", "avx512_vnni"],
+                        help="int8 quantization config for the target CPU ('' to skip)")
+    bench = sub.add_parser("bench", help="compare load time and single-query encode latency")
+    bench.add_argument("--model", default="nomic-ai/nomic-embed-text-v1.5")
+    bench.add_argument("--backends", nargs="*", default=list(BACKENDS), choices=BACKENDS)
+    bench.add_argument("--threads", type=int, default=EMBED_THREADS)
+    bench.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(args.model, args.output, args.quantize)
+    else:
+        for backend in args.backends:
+            benchmark(args.model, backend, args.threads, max(args.queries, 1))
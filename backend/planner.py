@@ -0,0 +1,159 @@
+import json
+import logging
+import os
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import bindparam, delete, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import String
+
+from backend.database import SavedCourse
+
+logger = logging.getLogger(__name__)
+
+PLANNER_CACHE_TTL = int(os.getenv("PLANNER_CACHE_TTL", "3600"))
+UNIQUE_CONSTRAINT = "uq_saved_courses_user_course"
+ORDER_INDEX = "ix_saved_courses_user_saved_at"
+
+# Valid codes are inserted and the rest reported, all in one statement. ON
+# CONFLICT makes double clicks and concurrent adds harmless.
+_ADD_SQL = text(f"""
+    WITH valid AS (
+        SELECT code FROM courses WHERE code = ANY(:codes)
+    ), added AS (
+        INSERT INTO saved_courses (user_id, course_code)
+        SELECT :user_id, code FROM valid
+        ON CONFLICT ON CONSTRAINT {UNIQUE_CONSTRAINT} DO NOTHING
+        RETURNING course_code
+    )
+    SELECT valid.code, added.course_code IS NOT NULL
+    FROM valid LEFT JOIN added ON added.course_code = valid.code
+""").bindparams(bindparam("codes", type_=ARRAY(String)))
+
+
+async def ensure_planner_constraints(conn):
+    """
+    Add the (user_id, course_code) unique constraint and the (user_id, saved_at)
+    index to saved_courses tables created before they were in the model.
+    Duplicate saves left by the old SELECT-then-INSERT race are collapsed first.
+    """
+    exists = (await conn.execute(
+        text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": UNIQUE_CONSTRAINT}
+    )).scalar()
+    if not exists:
+        removed = await conn.execute(text("""
+            DELETE FROM saved_courses a USING saved_courses b
+            WHERE a.user_id = b.user_id AND a.course_code = b.course_code AND a.id > b.id
+        """))
+        if removed.rowcount:
+            logger.info(f"Removed {removed.rowcount} duplicate saved courses")
+        await conn.execute(text(
+            f"ALTER TABLE saved_courses ADD CONSTRAINT {UNIQUE_CONSTRAINT} UNIQUE (user_id, course_code)"
+        ))
+    await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {ORDER_INDEX} ON saved_courses (user_id, saved_at)"))
+
+
+async def add_courses(session, user_id: str, course_codes: List[str]) -> Dict[str, str]:
+    """Save courses in one round trip. Returns code -> "added", "already saved" or "not found"."""
+    codes = list(dict.fromkeys(course_codes))
+    result = await session.execute(_ADD_SQL, {"user_id": user_id, "codes": codes})
+    found = dict(result.all())
+    await session.commit()
+    return {
+        code: "not found" if code not in found else ("added" if found[code] else "already saved")
+        for code in codes
+    }
+
+
+async def remove_courses(session, user_id: str, course_codes: List[str]) -> Dict[str, str]:
+    """Unsave courses in one round trip. Returns code -> "removed" or "not found"."""
+    codes = list(dict.fromkeys(course_codes))
+    result = await session.execute(
+        delete(SavedCourse)
+        .where(SavedCourse.user_id == user_id, SavedCourse.course_code.in_(codes))
+        .returning(SavedCourse.course_code)
+    )
+    removed = set(result.scalars().all())
+    await session.commit()
+    return {code: "removed" if code in removed else "not found" for code in codes}
+
+
+class PlannerCache:
+    """
+    Per-user cache of /planner/{user_id} responses. Every write gives the user
+    a new version token, and entries are keyed by version (and catalog
+    generation), so a read that raced a write can only ever store an entry
+    nobody reads again.
+    """
+
+    def __init__(self, redis_client, generation: Callable[[], Awaitable[int]], ttl: int = PLANNER_CACHE_TTL):
+        # redis_client must be created with decode_responses=True
+        self.redis = redis_client
+        self.generation = generation
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @staticmethod
+    def version_key(user_id: str) -> str:
+        return f"planner_version:{user_id}"
+
+    async def key(self, user_id: str) -> Optional[str]:
+        """Cache key for the user's current version; read it before querying Postgres. None if Redis is down."""
+        try:
+            version = await self.redis.get(self.version_key(user_id)) or 0
+            return f"planner:g{await self.generation()}:v{version}:{user_id}"
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Planner cache read failed: {e}")
+            return None
+
+    async def get(self, key: Optional[str]) -> Optional[List[dict]]:
+        if key is None:
+            return None
+        try:
+            cached = await self.redis.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Planner cache read failed: {e}")
+            return None
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(cached)
+
+    async def set(self, key: Optional[str], results: List[dict]):
+        if key is None:
+            return
+        try:
+            await self.redis.setex(key, self.ttl, json.dumps(results))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Planner cache write failed: {e}")
+
+    async def invalidate(self, user_id: str):
+        try:
+            # A fresh random token rather than a counter, so a version that lapsed
+            # and restarted can never collide with an entry still in Redis. It
+            # outlives the entries it versions (2x TTL), so an entry cached under
+            # "no version yet" has expired before that state can come back.
+            await self.redis.set(self.version_key(user_id), uuid.uuid4().hex, ex=2 * self.ttl)
+            self.invalidations += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Planner cache invalidation failed for {user_id}: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,55 +1,172 @@
+import argparse
 import asyncio
-import json
 import logging
+import os
+import time
+import redis.asyncio as redis
 from sqlalchemy import text
-from backend.database import engine, Base, Course
+from pgvector.asyncpg import register_vector
+from backend.database import engine, Base, EMBEDDING_DIM, MODEL_EMBEDDING_DIM, TRUNCATED_INDEX
+from backend.result_cache import bump_catalog_generation
+from backend.vector_index import create_vector_index, vector_index_exists, ensure_embedding_dim
+from backend.quantization import truncate_embeddings
+from backend.prerequisites import PREREQ_COLUMNS, collect_prerequisites
+from backend.lexical_search import ensure_lexical_index
+from backend.search_filters import ensure_filter_columns
+from backend.planner import ensure_planner_constraints
+from backend.embedding_files import EMBEDDINGS_FILE, METADATA_FILE, MANIFEST_FILE, read_manifest, iter_embedded_courses
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Rows per COPY batch; progress is logged after each one
+COPY_BATCH_SIZE = int(os.getenv("COPY_BATCH_SIZE", "5000"))
+COURSE_COLUMNS = ["code", "name", "subject", "description", "embedding", "embedding_short"]
+
 async def init_db():
     logger.info("Initializing database...")
     async with engine.begin() as conn:
         # Create pgvector extension if it doesn't exist
         await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         
-        # Create all tables
-        await conn.run_sync(Base.metadata.drop_all)
+        # Create any missing tables. Existing rows are kept and upserted by
+        # populate_db, so the site keeps serving (and saved courses survive) a reload.
         await conn.run_sync(Base.metadata.create_all)
+        # Full-text and filter columns/indexes for tables created before they were in the model
+        await ensure_lexical_index(conn)
+        await ensure_filter_columns(conn)
+        await ensure_embedding_dim(conn)
+        await ensure_planner_constraints(conn)
     logger.info("Database initialized successfully.")
 
-async def populate_db():
-    input_file = "scraper/courses_embedded.json"
-    
-    try:
-        with open(input_file, 'r') as f:
-            courses_data = json.load(f)
-    except FileNotFoundError:
-        logger.error(f"{input_file} not found. Ensure scrape.py and embed.py have run.")
+def course_records(courses, batch_size: int, prerequisites: dict):
+    """
+    Group course dicts into lists of COPY records. Prerequisites are parsed from
+    each description on the way through and collected into `prerequisites`
+    (code -> course_prerequisites row).
+    """
+    batch = []
+    for c in courses:
+        collect_prerequisites(c, prerequisites)
+        # Full-width vectors for exact scoring, plus the Matryoshka-truncated
+        # copy the ANN index covers when EMBEDDING_DIM is narrower
+        c["embedding_short"] = truncate_embeddings(c["embedding"], EMBEDDING_DIM) if TRUNCATED_INDEX else None
+        c["embedding"] = truncate_embeddings(c["embedding"], MODEL_EMBEDDING_DIM)
+        batch.append(tuple(c.get(col) for col in COURSE_COLUMNS))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def populate_db(prune: bool = True, manifest_path: str = MANIFEST_FILE,
+                      embeddings_path: str = EMBEDDINGS_FILE, metadata_path: str = METADATA_FILE):
+    """
+    Bulk load the embedded catalog: binary COPY into a temporary staging table,
+    then a single INSERT ... ON CONFLICT (code) DO UPDATE into courses inside one
+    transaction, so readers see either the old or the new catalog and never an
+    empty table.
+    """
+    manifest = read_manifest(manifest_path)
+    if not manifest or not manifest.get("complete"):
+        logger.error(f"{manifest_path} missing or incomplete. Ensure scrape.py and embed.py have run.")
         return
 
-    from backend.database import AsyncSessionLocal
-    
-    logger.info(f"Populating database with {len(courses_data)} courses...")
-    
-    async with AsyncSessionLocal() as session:
-        for course_data in courses_data:
-            course = Course(
-                code=course_data['code'],
-                name=course_data['name'],
-                subject=course_data['subject'],
-                description=course_data['description'],
-                embedding=course_data.get('embedding')
+    if manifest["dim"] != MODEL_EMBEDDING_DIM:
+        logger.error(f"MODEL_EMBEDDING_DIM={MODEL_EMBEDDING_DIM} does not match the {manifest['dim']}-dim embeddings on disk.")
+        return
+
+    total = manifest["count"]
+    logger.info(f"Populating database with {total} courses...")
+    start = time.perf_counter()
+    columns = ", ".join(COURSE_COLUMNS)
+    updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in COURSE_COLUMNS if col != "code")
+
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        apg = raw.driver_connection
+        # Binary codec so numpy vectors are sent to COPY without text formatting
+        await register_vector(apg)
+
+        async with apg.transaction():
+            await apg.execute(
+                "CREATE TEMP TABLE courses_staging (LIKE courses INCLUDING DEFAULTS) ON COMMIT DROP"
             )
-            session.add(course)
-        
-        await session.commit()
-        
-    logger.info("Database population complete.")
+            # Numbers rows in COPY order so the last copy of a duplicated code wins
+            await apg.execute(
+                "ALTER TABLE courses_staging ADD COLUMN load_order bigint GENERATED ALWAYS AS IDENTITY"
+            )
+
+            loaded = 0
+            prerequisites = {}
+            for batch in course_records(iter_embedded_courses(manifest_path, embeddings_path, metadata_path), COPY_BATCH_SIZE, prerequisites):
+                await apg.copy_records_to_table("courses_staging", records=batch, columns=COURSE_COLUMNS)
+                loaded += len(batch)
+                elapsed = time.perf_counter() - start
+                logger.info(f"Copied {loaded}/{total} rows ({loaded / elapsed:,.0f} rows/s)")
+
+            # DISTINCT ON guards against duplicate codes in the scrape, which
+            # ON CONFLICT cannot apply twice in one statement; like the
+            # prerequisites dict, the later occurrence in the load wins.
+            upserted = await apg.fetch(f"""
+                INSERT INTO courses ({columns})
+                SELECT DISTINCT ON (code) {columns} FROM courses_staging ORDER BY code, load_order DESC
+                ON CONFLICT (code) DO UPDATE SET {updates}
+                RETURNING (xmax = 0) AS inserted
+            """)
+            inserted = sum(1 for row in upserted if row["inserted"])
+
+            # Replace the parsed prerequisites of every course in this load
+            await apg.execute("""
+                DELETE FROM course_prerequisites p USING courses_staging s WHERE p.course_code = s.code
+            """)
+            await apg.copy_records_to_table(
+                "course_prerequisites", records=list(prerequisites.values()), columns=PREREQ_COLUMNS
+            )
+
+            removed = 0
+            if prune:
+                # Courses gone from the catalog are dropped unless someone saved them
+                status = await apg.execute("""
+                    DELETE FROM courses c
+                    WHERE NOT EXISTS (SELECT 1 FROM courses_staging s WHERE s.code = c.code)
+                      AND NOT EXISTS (SELECT 1 FROM saved_courses sc WHERE sc.course_code = c.code)
+                """)
+                removed = int(status.split()[-1])
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Database population complete: {loaded} rows in {elapsed:.1f}s ({loaded / max(elapsed, 1e-9):,.0f} rows/s); "
+        f"{inserted} inserted, {len(upserted) - inserted} updated, {removed} removed; "
+        f"{len(prerequisites)} with parsed prerequisites."
+    )
+
+async def build_indexes(reindex: bool = False):
+    """Build the ANN index after the first bulk load; later upserts maintain it in place."""
+    async with engine.begin() as conn:
+        if reindex or not await vector_index_exists(conn):
+            await create_vector_index(conn)
+
+async def invalidate_search_cache():
+    """Move to a new catalog generation so cached /search results are no longer served."""
+    redis_client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+    try:
+        await bump_catalog_generation(redis_client)
+    except Exception as e:
+        logger.warning(f"Could not bump catalog generation (search cache may serve stale results): {e}")
+    finally:
+        await redis_client.aclose()
 
 async def main():
+    parser = argparse.ArgumentParser(description="Load embedded courses into Postgres")
+    parser.add_argument("--reindex", action="store_true", help="rebuild the ANN index even if it exists")
+    parser.add_argument("--no-prune", action="store_true", help="keep courses missing from this load")
+    args = parser.parse_args()
+
     await init_db()
-    await populate_db()
+    await populate_db(prune=not args.no_prune)
+    await build_indexes(reindex=args.reindex)
+    await invalidate_search_cache()
 
 if __name__ == "__main__":
     asyncio.run(main())
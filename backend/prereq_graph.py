@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from backend.result_cache import CATALOG_GENERATION_KEY
+
+logger = logging.getLogger(__name__)
+
+# How often servers check whether populate.py reloaded the catalog
+PREREQ_GRAPH_POLL_SECONDS = float(os.getenv("PREREQ_GRAPH_POLL_SECONDS", "30"))
+
+_EMPTY = np.empty(0, dtype=np.int32)
+
+
+def _csr(adjacency: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(adjacency) + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum([len(targets) for targets in adjacency], dtype=np.int64)
+    flat = [t for targets in adjacency for t in targets]
+    return offsets, np.asarray(flat, dtype=np.int32)
+
+
+def _strongly_connected(offsets: np.ndarray, targets: np.ndarray) -> List[List[int]]:
+    """
+    Iterative Tarjan. Components come out prerequisites-first (a component is
+    emitted only after every component it depends on), which is the order
+    ancestors have to be computed in.
+    """
+    # Plain lists: per-element numpy indexing is far slower in this loop
+    offsets, targets = offsets.tolist(), targets.tolist()
+    n = len(offsets) - 1
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack, components = [], []
+    counter = 0
+
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        work = [(root, offsets[root])]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        while work:
+            node, edge = work[-1]
+            if edge < offsets[node + 1]:
+                work[-1] = (node, edge + 1)
+                child = targets[edge]
+                if index[child] == -1:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack[child] = True
+                    work.append((child, offsets[child]))
+                elif on_stack[child]:
+                    low[node] = min(low[node], index[child])
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+class PrerequisiteGraph:
+    """
+    In-memory prerequisite DAG over course_prerequisites. Courses are integer
+    node IDs with CSR (offsets/targets array) adjacency; referenced codes that
+    aren't in the catalog get no node. Every node's transitive ancestors are
+    precomputed, so a chain lookup is an array read plus a sort by topological
+    rank. Cycles in the catalog text are detected and reported rather than
+    breaking the build.
+
+    IDs are stable across rebuilds, so a rebuild only recomputes ancestors for
+    courses whose prerequisites changed and the courses that depend on them.
+    """
+
+    def __init__(self):
+        self.codes: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.requires: Dict[str, Tuple[str, ...]] = {}
+        self.raw_text: Dict[str, str] = {}
+        self.in_catalog: Set[str] = set()
+        self.offsets = np.zeros(1, dtype=np.int32)
+        self.targets = _EMPTY
+        self.rank = _EMPTY
+        self.ancestors: List[np.ndarray] = []
+        self.cycles: List[List[str]] = []
+        self.generation: Optional[int] = None
+        self.last_build: dict = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.generation is not None
+
+    def rebuild(self, rows: Iterable[Tuple[str, Optional[str], Sequence[str]]], in_catalog: Set[str]) -> dict:
+        """Replace the graph with (course_code, raw_text, requires) rows, reusing unaffected ancestors."""
+        state = self._build(rows, in_catalog)
+        self._apply(state)
+        return self.last_build
+
+    def _apply(self, state: dict):
+        # Called on the event loop, so requests never see half of a rebuild
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def _build(self, rows, in_catalog: Set[str]) -> dict:
+        """Compute a new graph state without touching the one being served (safe in a worker thread)."""
+        start = time.perf_counter()
+        requires, raw_text = {}, {}
+        unknown = set()
+        for code, text, prereqs in rows:
+            # Codes the parser found that aren't courses (misparses, retired courses)
+            # would become phantom nodes in every chain, so they are left out
+            prereqs = tuple(dict.fromkeys(prereqs or ()))
+            unknown.update(p for p in prereqs if p not in in_catalog)
+            requires[code] = tuple(p for p in prereqs if p in in_catalog)
+            raw_text[code] = text
+
+        ids, codes = dict(self.ids), list(self.codes)
+        for code in list(requires) + [p for prereqs in requires.values() for p in prereqs]:
+            if code not in ids:
+                ids[code] = len(codes)
+                codes.append(code)
+        n = len(codes)
+
+        adjacency = [[] for _ in range(n)]
+        dependents = [[] for _ in range(n)]
+        for code, prereqs in requires.items():
+            node = ids[code]
+            for p in prereqs:
+                adjacency[node].append(ids[p])
+                dependents[ids[p]].append(node)
+        offsets, targets = _csr(adjacency)
+        components = _strongly_connected(offsets, targets)
+
+        rank = [0] * n
+        cycles, cyclic = [], set()
+        for position, component in enumerate(components):
+            for m in component:
+                rank[m] = position
+            if len(component) > 1 or component[0] in adjacency[component[0]]:
+                cycles.append(sorted(codes[m] for m in component))
+                cyclic.update(component)
+
+        # Courses whose ancestor set can have changed: edited courses, everything
+        # downstream of them, and anything on a cycle
+        changed = {ids[c] for c in set(requires) | set(self.requires) if requires.get(c, ()) != self.requires.get(c, ())}
+        affected = set(changed) | cyclic
+        frontier = list(affected)
+        while frontier:
+            node = frontier.pop()
+            for dependent in dependents[node]:
+                if dependent not in affected:
+                    affected.add(dependent)
+                    frontier.append(dependent)
+
+        previous = self.ancestors
+        ancestors: List[np.ndarray] = [_EMPTY] * n
+        recomputed = 0
+        reusable = len(previous)
+        for component in components:
+            if all(m < reusable and m not in affected for m in component):
+                for m in component:
+                    ancestors[m] = previous[m]
+                continue
+            # Members of a cycle are each other's ancestors
+            parts = [np.asarray(component, dtype=np.int32)] if len(component) > 1 else []
+            for m in component:
+                direct = targets[offsets[m]:offsets[m + 1]]
+                parts.append(direct)
+                parts.extend(ancestors[p] for p in direct)
+            union = np.unique(np.concatenate(parts)).astype(np.int32) if parts else _EMPTY
+            for m in component:
+                # A course is never listed as its own prerequisite, even on a cycle
+                ancestors[m] = union[union != m]
+                recomputed += 1
+
+        if unknown:
+            sample = sorted(unknown)[:10]
+            logger.info(f"Skipped {len(unknown)} prerequisite codes not in the catalog: {sample}{' ...' if len(unknown) > 10 else ''}")
+        if cycles:
+            logger.warning(f"Prerequisite cycles: {cycles[:5]}{' ...' if len(cycles) > 5 else ''}")
+        return {
+            "codes": codes, "ids": ids, "requires": requires, "raw_text": raw_text, "in_catalog": in_catalog,
+            "offsets": offsets, "targets": targets, "rank": np.asarray(rank, dtype=np.int32), "ancestors": ancestors, "cycles": cycles,
+            "last_build": {
+                "nodes": n,
+                "edges": int(len(targets)),
+                "changed": len(changed),
+                "recomputed": recomputed,
+                "cycles": len(cycles),
+                "unknown_codes": len(unknown),
+                "ms": (time.perf_counter() - start) * 1000,
+            },
+        }
+
+    def _ordered(self, nodes: np.ndarray) -> List[str]:
+        """Codes in topological order, prerequisites first."""
+        return [self.codes[i] for i in nodes[np.argsort(self.rank[nodes], kind="stable")]]
+
+    def _entries(self, codes: List[str]) -> List[dict]:
+        return [
+            {"code": code, "requires": list(self.requires.get(code, ())), "in_catalog": code in self.in_catalog}
+            for code in codes
+        ]
+
+    def course_chain(self, course_code: str) -> dict:
+        """Everything to take before `course_code`, prerequisites first."""
+        node = self.ids.get(course_code)
+        chain = self._ordered(self.ancestors[node]) if node is not None else []
+        return {
+            "course_code": course_code,
+            "prerequisites": self.raw_text.get(course_code),
+            "requires": list(self.requires.get(course_code, ())),
+            "chain": self._entries(chain),
+        }
+
+    def plan_chain(self, course_codes: List[str]) -> dict:
+        """The combined chain for a set of planned courses, and which of it isn't planned yet."""
+        nodes = [self.ids[c] for c in course_codes if c in self.ids]
+        combined = np.unique(np.concatenate([self.ancestors[i] for i in nodes])) if nodes else _EMPTY
+        chain = self._ordered(combined.astype(np.int32))
+        planned = set(course_codes)
+        return {
+            "courses": course_codes,
+            "chain": self._entries(chain),
+            "missing": [code for code in chain if code not in planned],
+        }
+
+    def stats(self) -> dict:
+        return {"generation": self.generation, "cycles": self.cycles[:20], **self.last_build}
+
+    async def refresh(self, redis_client, force: bool = False) -> bool:
+        """Rebuild from Postgres if the catalog generation moved. Returns True if rebuilt."""
+        value = await redis_client.get(CATALOG_GENERATION_KEY)
+        generation = int(value) if value else 0
+        if generation == self.generation and not force:
+            return False
+        rows, in_catalog = await load_prerequisite_rows()
+        state = await asyncio.to_thread(self._build, rows, in_catalog)
+        self._apply(state)
+        self.generation = generation
+        stats = self.last_build
+        logger.info(
+            f"Prerequisite graph g{generation}: {stats['nodes']} courses, {stats['edges']} edges, "
+            f"{stats['changed']} changed, {stats['recomputed']} recomputed in {stats['ms']:.1f}ms"
+        )
+        return True
+
+    async def watch(self, redis_client, interval: float = PREREQ_GRAPH_POLL_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(redis_client)
+            except Exception as e:
+                logger.error(f"Prerequisite graph refresh failed: {e}")
+
+    def start_watching(self, redis_client):
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self.watch(redis_client))
+
+    async def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+
+async def load_prerequisite_rows():
+    """All course_prerequisites rows, plus which referenced codes exist in the catalog."""
+    from sqlalchemy import text
+    from backend.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(
+            text("SELECT course_code, raw_text, requires FROM course_prerequisites")
+        )).all()
+        in_catalog = (await session.execute(text("""
+            SELECT code FROM courses
+            WHERE code IN (SELECT course_code FROM course_prerequisites)
+               OR code IN (SELECT unnest(requires) FROM course_prerequisites)
+        """))).scalars().all()
+    return rows, set(in_catalog)
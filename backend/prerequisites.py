@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import html
+import logging
+import re
+import time
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# "Prerequisite(s): ...", "Prereq: ..." or "Prerequisites for majors: ..." up to the
+# end of that sentence (the variant settled on in scripts/test_regex.py). The colon
+# is required, so prose that merely mentions a prerequisite isn't captured.
+PREREQ_RE = re.compile(
+    r'\b(?:Prerequisite|Prereq)[s]?\b\s*(?:for[a-z\sA-Z-]*)?:\s*(.*?)(?:\.\s+(?=[A-Z])|$)',
+    re.IGNORECASE | re.DOTALL,
+)
+# Fields folded into FOSE details text by live_scraper.combine_description
+RESTRICTIONS_RE = re.compile(r'Restrictions:\s*(.*?)(?: \n|$)')
+NOTES_RE = re.compile(r'Notes:\s*(.*)')
+# "CSCI-UA 101", "CSCI-UA.0101", and runs like "MATH-UA 121, 122 or 140". A number
+# followed by a unit ("and 2 semesters of calculus") ends the run rather than joining it.
+_NOT_A_COUNT = r'(?![\s-]*(?i:semesters?|credits?|points?|units?|years?|hours?|courses?|classes|terms?)\b)'
+CODE_RUN_RE = re.compile(
+    r'\b([A-Z]{2,8}-[A-Z]{2,3})[\s.]*(\d{1,4}[A-Z]?)\b'
+    r'((?:\s*(?:,|/|&|\bor\b|\band\b)\s*\d{1,4}[A-Z]?\b' + _NOT_A_COUNT + r')*)'
+)
+NUMBER_RE = re.compile(r'\d{1,4}[A-Z]?')
+
+# Longer matches are almost always the regex running on into the description
+MAX_PREREQ_CHARS = 300
+# Compared after trailing punctuation is stripped ("None.", "none;")
+_EMPTY_PREREQS = {"", "none", "n/a"}
+
+PREREQ_COLUMNS = ["course_code", "raw_text", "requires"]
+
+
+def referenced_codes(text: str) -> List[str]:
+    """Course codes mentioned in prerequisite text, in order, without duplicates."""
+    codes = []
+    for subject, number, tail in CODE_RUN_RE.findall(text or ""):
+        for n in [number] + NUMBER_RE.findall(tail):
+            # Albert writes CSCI-UA.0101 for the bulletin's CSCI-UA 101
+            code = f"{subject} {n.lstrip('0') or n}"
+            if code not in codes:
+                codes.append(code)
+    return codes
+
+
+def parse_prerequisites(description: Optional[str]) -> Optional[Tuple[str, List[str]]]:
+    """Prerequisite text and the course codes it references, or None if the description has none."""
+    if not description:
+        return None
+    match = PREREQ_RE.search(description)
+    if not match:
+        return None
+    raw_text = " ".join(match.group(1).split())
+    if raw_text.rstrip(" .,;:").lower() in _EMPTY_PREREQS or len(raw_text) > MAX_PREREQ_CHARS:
+        return None
+    return raw_text, referenced_codes(raw_text)
+
+
+def details_prerequisites(found_description: str) -> str:
+    """
+    The "prerequisites" string of a details payload, from FOSE description text
+    combined with its restrictions and notes. Run once when FOSE data is fetched
+    or snapshotted, never when a cached payload is served.
+    """
+    prereqs = "None"
+    extra_notes = ""
+    if found_description:
+        match = PREREQ_RE.search(found_description)
+        if match:
+            prereqs = " ".join(match.group(1).split())
+
+        restr_match = RESTRICTIONS_RE.search(found_description)
+        if restr_match: extra_notes += restr_match.group(1).strip() + ". "
+
+        notes_match = NOTES_RE.search(found_description)
+        if notes_match: extra_notes += notes_match.group(1).strip()
+
+    if extra_notes and prereqs == "None":
+        prereqs = extra_notes.strip()
+    elif extra_notes:
+        prereqs = prereqs + " | Notes: " + extra_notes.strip()
+    return html.unescape(prereqs) if prereqs else "None"
+
+
+def collect_prerequisites(course: dict, records: dict):
+    """Parse one course into `records` (code -> course_prerequisites row); later duplicates of a code win."""
+    parsed = parse_prerequisites(course.get("description"))
+    if parsed:
+        records[course["code"]] = (course["code"], parsed[0], parsed[1])
+    else:
+        records.pop(course["code"], None)
+
+
+def prerequisite_records(courses: Iterable[dict]) -> List[tuple]:
+    """course_prerequisites rows for a stream of course dicts."""
+    records = {}
+    for course in courses:
+        collect_prerequisites(course, records)
+    return list(records.values())
+
+
+async def rebuild_prerequisites():
+    """Re-extract every course's prerequisites from the courses table in one transaction."""
+    from sqlalchemy import delete, insert, text
+    from backend.database import engine, Base, CoursePrerequisite
+
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        result = await conn.execute(text("SELECT code, description FROM courses"))
+        records = prerequisite_records({"code": code, "description": desc} for code, desc in result.all())
+        await conn.execute(delete(CoursePrerequisite))
+        if records:
+            await conn.execute(insert(CoursePrerequisite), [dict(zip(PREREQ_COLUMNS, r)) for r in records])
+    logger.info(f"Stored prerequisites for {len(records)} courses in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Rebuild course_prerequisites from catalog descriptions")
+    parser.parse_args()
+    asyncio.run(rebuild_prerequisites())
@@ -0,0 +1,62 @@
+import os
+from typing import Tuple
+
+import numpy as np
+
+# Quantized first passes pull this many times top_k candidates, which are then
+# re-ranked exactly against the stored float vectors.
+RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", "4"))
+
+# Rows scored per chunk so temporary float copies of the codes stay small
+_CHUNK = 8192
+# Set bits per byte value, for Hamming distances on packed codes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def truncate_embeddings(vectors, dim: int) -> np.ndarray:
+    """
+    Matryoshka truncation for nomic-embed-text-v1.5: center each vector over its
+    full width (the layer norm Nomic applies before truncating), keep the first
+    `dim` components and L2-normalize. Vectors already `dim` wide are only normalized.
+    Works on a single vector or a (rows, width) matrix.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dim and dim < vectors.shape[-1]:
+        vectors = vectors - vectors.mean(axis=-1, keepdims=True)
+        vectors = vectors[..., :dim]
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def int8_codes(matrix) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-dimension int8 codes; row @ query ~= codes @ (query * scale)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scale = np.abs(matrix).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8)
+    return codes, scale.astype(np.float32)
+
+
+def binary_codes(matrix) -> np.ndarray:
+    """One sign bit per dimension, packed eight to a byte (same idea as pgvector's binary_quantize)."""
+    return np.packbits(np.asarray(matrix) > 0, axis=-1)
+
+
+def int8_scores(codes: np.ndarray, scale: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Approximate inner products of every row with `query`."""
+    scaled = (query * scale).astype(np.float32)
+    scores = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], _CHUNK):
+        scores[start:start + _CHUNK] = np.asarray(codes[start:start + _CHUNK], dtype=np.float32) @ scaled
+    return scores
+
+
+def hamming_scores(codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Negated Hamming distance between packed codes and the query's sign bits (higher is closer)."""
+    query_bits = binary_codes(query)
+    distances = np.empty(codes.shape[0], dtype=np.int32)
+    for start in range(0, codes.shape[0], _CHUNK):
+        xor = np.bitwise_xor(codes[start:start + _CHUNK], query_bits)
+        distances[start:start + _CHUNK] = _POPCOUNT[xor].sum(axis=1, dtype=np.int32)
+    return -distances.astype(np.float32)
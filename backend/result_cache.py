@@ -0,0 +1,97 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import List, Optional
+
+from backend.embedding_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Bumped by populate.py every time the courses table is reloaded. Result keys
+# embed the generation, so stale entries simply stop being read after a re-scrape.
+CATALOG_GENERATION_KEY = "catalog:generation"
+SEARCH_RESULT_TTL = int(os.getenv("SEARCH_RESULT_TTL", "86400"))
+# How long a worker trusts its copy of the generation before re-reading Redis
+GENERATION_REFRESH_SECONDS = float(os.getenv("CATALOG_GENERATION_REFRESH", "2"))
+
+
+async def bump_catalog_generation(redis_client) -> int:
+    """Invalidate every cached search result by moving to a new catalog generation."""
+    generation = await redis_client.incr(CATALOG_GENERATION_KEY)
+    logger.info(f"Catalog generation bumped to {generation}")
+    return int(generation)
+
+
+class SearchResultCache:
+    """
+    Caches serialized /search responses in Redis under a key that includes the
+    catalog generation. One entry is kept per query (plus variant) holding the
+    largest top_k seen, so any smaller top_k is served by slicing it.
+    """
+
+    def __init__(self, redis_client, ttl: int = SEARCH_RESULT_TTL):
+        # redis_client must be created with decode_responses=True
+        self.redis = redis_client
+        self.ttl = ttl
+        self._generation = 0
+        self._generation_checked_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def generation(self) -> int:
+        now = time.monotonic()
+        if now - self._generation_checked_at >= GENERATION_REFRESH_SECONDS:
+            value = await self.redis.get(CATALOG_GENERATION_KEY)
+            self._generation = int(value) if value else 0
+            self._generation_checked_at = now
+        return self._generation
+
+    async def _key(self, query: str, variant: str) -> str:
+        generation = await self.generation()
+        digest = hashlib.sha1(f"{normalize_query(query)}\0{variant}".encode()).hexdigest()
+        return f"search_results:g{generation}:{digest}"
+
+    async def get(self, query: str, top_k: int, variant: str = "") -> Optional[List[dict]]:
+        try:
+            cached = await self.redis.get(await self._key(query, variant))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Search result cache read failed: {e}")
+            return None
+
+        if cached:
+            entry = json.loads(cached)
+            results = entry["results"]
+            # A larger cached top_k covers this request; so does a short list that
+            # already holds every matching course.
+            if entry["top_k"] >= top_k or len(results) < entry["top_k"]:
+                self.hits += 1
+                return results[:top_k]
+
+        self.misses += 1
+        return None
+
+    async def set(self, query: str, top_k: int, results: List[dict], variant: str = ""):
+        try:
+            key = await self._key(query, variant)
+            cached = await self.redis.get(key)
+            if cached and json.loads(cached)["top_k"] >= top_k:
+                return
+            await self.redis.setex(key, self.ttl, json.dumps({"top_k": top_k, "results": results}))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Search result cache write failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "generation": self._generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
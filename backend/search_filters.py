@@ -0,0 +1,42 @@
+from typing import List, Optional
+
+from sqlalchemy import exists, text
+
+from backend.database import Course, CoursePrerequisite, SCHOOL_SQL
+
+
+def normalize_school(school: Optional[str]) -> Optional[str]:
+    """Accept "-UA", "ua" or "UA" and return "UA"."""
+    if not school:
+        return None
+    return school.strip().lstrip("-").upper() or None
+
+
+def filter_clauses(subject: Optional[str] = None, school: Optional[str] = None,
+                   has_prereqs: Optional[bool] = None) -> List:
+    """SQLAlchemy WHERE clauses for the /search filters; empty when nothing is filtered."""
+    clauses = []
+    if subject:
+        clauses.append(Course.subject == subject)
+    school = normalize_school(school)
+    if school:
+        clauses.append(Course.school == school)
+    if has_prereqs is not None:
+        # Same source as the details endpoint: prerequisites parsed at populate time
+        parsed = exists().where(CoursePrerequisite.course_code == Course.code)
+        clauses.append(parsed if has_prereqs else ~parsed)
+    return clauses
+
+
+async def ensure_filter_columns(conn):
+    """
+    Add the generated filter columns and their B-tree indexes to an existing
+    courses table (create_all only creates missing tables).
+    """
+    await conn.execute(text(
+        f"ALTER TABLE courses ADD COLUMN IF NOT EXISTS school varchar(10) GENERATED ALWAYS AS ({SCHOOL_SQL}) STORED"
+    ))
+    # Superseded by course_prerequisites, which the has_prereqs filter now reads
+    await conn.execute(text("ALTER TABLE courses DROP COLUMN IF EXISTS has_prereqs"))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_courses_subject ON courses (subject)"))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_courses_school ON courses (school)"))
@@ -0,0 +1,360 @@
+import argparse
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import Optional
+
+from pgvector.sqlalchemy import HALFVEC, BIT, VECTOR
+from sqlalchemy import cast, func, text
+from sqlalchemy.future import select
+
+from backend.database import engine, AsyncSessionLocal, Course, EMBEDDING_DIM, MODEL_EMBEDDING_DIM, TRUNCATED_INDEX
+from backend.quantization import RERANK_FACTOR, truncate_embeddings
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_NAME = "ix_courses_embedding_ann"
+# "hnsw", "ivfflat" or "none"
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw").lower()
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+# "none" indexes the float vectors; "halfvec" (half the index size) or "binary"
+# (1/32) index a quantized expression whose candidates are re-ranked exactly.
+# Needs pgvector 0.7+. Changing it requires `python -m backend.populate --reindex`.
+PGVECTOR_QUANTIZATION = os.getenv("PGVECTOR_QUANTIZATION", "none").lower()
+
+# Server-side defaults for the recall/latency knobs; requests may override them.
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+MAX_EF_SEARCH = 1000
+MAX_PROBES = 1000
+
+# Schools with at least this many embedded courses get their own partial index
+PARTIAL_INDEX_MIN_ROWS = int(os.getenv("PARTIAL_INDEX_MIN_ROWS", "2000"))
+_iterative_scan = None
+
+
+def ivfflat_lists(row_count: int) -> int:
+    """List count recommended by pgvector: rows/1000 up to 1M rows, sqrt(rows) beyond."""
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return max(1, int(math.sqrt(row_count)))
+
+
+async def vector_index_exists(conn) -> bool:
+    result = await conn.execute(
+        text("SELECT 1 FROM pg_indexes WHERE tablename = 'courses' AND indexname = :name"),
+        {"name": VECTOR_INDEX_NAME},
+    )
+    return result.scalar() is not None
+
+
+def _first_pass_column():
+    """The column the ANN index covers: the Matryoshka-truncated copy when EMBEDDING_DIM is narrower."""
+    return Course.embedding_short if TRUNCATED_INDEX else Course.embedding
+
+
+def _index_target(quantization: str) -> str:
+    """Indexed expression and operator class; must match vector_search() exactly."""
+    column = _first_pass_column().key
+    if quantization == "none":
+        return f"{column} vector_cosine_ops"
+    if quantization == "halfvec":
+        return f"({column}::halfvec({EMBEDDING_DIM})) halfvec_cosine_ops"
+    if quantization == "binary":
+        return f"(binary_quantize({column})::bit({EMBEDDING_DIM})) bit_hamming_ops"
+    raise ValueError(f"Unknown PGVECTOR_QUANTIZATION: {quantization}")
+
+
+async def _build_index(conn, name: str, index_type: str, where: str = "", row_count: int = 0,
+                       quantization: str = PGVECTOR_QUANTIZATION) -> str:
+    where_sql = f" WHERE {where}" if where else ""
+    target = _index_target(quantization)
+    if index_type == "hnsw":
+        await conn.execute(text(
+            f"CREATE INDEX {name} ON courses "
+            f"USING hnsw ({target}) "
+            f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}){where_sql}"
+        ))
+        return f"m={HNSW_M}, ef_construction={HNSW_EF_CONSTRUCTION}, quantization={quantization}"
+    if index_type == "ivfflat":
+        lists = ivfflat_lists(row_count)
+        await conn.execute(text(
+            f"CREATE INDEX {name} ON courses "
+            f"USING ivfflat ({target}) WITH (lists = {lists}){where_sql}"
+        ))
+        return f"lists={lists} for {row_count} rows, quantization={quantization}"
+    raise ValueError(f"Unknown VECTOR_INDEX_TYPE: {index_type}")
+
+
+def candidate_count(limit: int, quantization: str = PGVECTOR_QUANTIZATION, rerank_factor: int = RERANK_FACTOR) -> int:
+    """
+    Rows the index scan has to yield for a LIMIT of `limit`: the re-rank pool when
+    quantized or truncated. The pool is capped at MAX_EF_SEARCH (but never below
+    `limit`), so deep pages get a smaller re-rank multiple rather than a short page.
+    """
+    if not reranked(quantization):
+        return limit
+    return min(limit * max(1, rerank_factor), max(limit, MAX_EF_SEARCH))
+
+
+def reranked(quantization: str = PGVECTOR_QUANTIZATION) -> bool:
+    """Whether the index only yields candidates that are re-ranked on the full float vectors."""
+    return quantization != "none" or TRUNCATED_INDEX
+
+
+def candidate_search(query, limit: int, clauses=(), quantization: str = PGVECTOR_QUANTIZATION,
+                     rerank_factor: int = RERANK_FACTOR):
+    """
+    The first pass of vector_search: candidate_count() rows ordered by the indexed
+    (truncated and/or halfvec/binary) expression, each with its exact cosine
+    distance on the full-width courses.embedding.
+    """
+    full_query = list(map(float, query))
+    short_query = list(map(float, truncate_embeddings(query, EMBEDDING_DIM))) if TRUNCATED_INDEX else full_query
+    column = _first_pass_column()
+    columns = (Course.code, Course.name, Course.subject, Course.description)
+    exact = Course.embedding.cosine_distance(full_query)
+    if quantization == "none":
+        approx = column.cosine_distance(short_query)
+    elif quantization == "halfvec":
+        approx = cast(column, HALFVEC(EMBEDDING_DIM)).cosine_distance(short_query)
+    elif quantization == "binary":
+        approx = cast(func.binary_quantize(column), BIT(EMBEDDING_DIM)).hamming_distance(
+            func.binary_quantize(cast(short_query, VECTOR(EMBEDDING_DIM)))
+        )
+    else:
+        raise ValueError(f"Unknown PGVECTOR_QUANTIZATION: {quantization}")
+
+    return (
+        select(*columns, exact.label("distance"))
+        .where(*clauses)
+        .order_by(approx)
+        .limit(candidate_count(limit, quantization, rerank_factor))
+    )
+
+
+def vector_search(query, limit: int, clauses=(), quantization: str = PGVECTOR_QUANTIZATION,
+                  rerank_factor: int = RERANK_FACTOR):
+    """
+    SELECT code, name, subject, description, distance for the nearest courses.
+    `query` is the full-width normalized query. Quantized or truncated indexes
+    are searched for limit * rerank_factor candidates, which are then re-ranked
+    by exact cosine distance on the full-width float vectors.
+    """
+    if not reranked(quantization):
+        query = list(map(float, query))
+        columns = (Course.code, Course.name, Course.subject, Course.description)
+        exact = Course.embedding.cosine_distance(query)
+        return select(*columns, exact.label("distance")).where(*clauses).order_by("distance").limit(limit)
+
+    candidates = candidate_search(query, limit, clauses, quantization, rerank_factor).subquery()
+    return select(candidates).order_by(candidates.c.distance).limit(limit)
+
+
+async def ensure_embedding_dim(conn, model_dim: int = MODEL_EMBEDDING_DIM, dim: int = EMBEDDING_DIM) -> bool:
+    """
+    Size courses.embedding to MODEL_EMBEDDING_DIM and courses.embedding_short to
+    EMBEDDING_DIM, adding the latter to tables created before it existed.
+    Existing vectors can't be converted in SQL, so resized columns are cleared
+    (along with the ANN indexes) and the next populate run reloads them.
+    Returns True if a column was changed.
+    """
+    await conn.execute(text(f"ALTER TABLE courses ADD COLUMN IF NOT EXISTS embedding_short vector({dim})"))
+    changed = False
+    for column, width in (("embedding", model_dim), ("embedding_short", dim)):
+        current = (await conn.execute(text(
+            "SELECT atttypmod FROM pg_attribute WHERE attrelid = 'courses'::regclass AND attname = :column"
+        ), {"column": column})).scalar()
+        if current is None or current == width:
+            continue
+        logger.warning(f"Resizing courses.{column} from {current} to {width} dims; embeddings are cleared until reloaded")
+        await drop_vector_indexes(conn)
+        await conn.execute(text(f"ALTER TABLE courses ALTER COLUMN {column} TYPE vector({width}) USING NULL"))
+        changed = True
+    return changed
+
+
+async def drop_vector_indexes(conn):
+    """Drop the main ANN index and every per-school partial index."""
+    existing = await conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'courses' AND indexname LIKE :prefix"
+    ), {"prefix": f"{VECTOR_INDEX_NAME}%"})
+    for (name,) in existing.all():
+        await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+async def create_vector_index(conn, index_type: str = VECTOR_INDEX_TYPE):
+    """
+    (Re)build the cosine ANN index on courses.embedding, plus one partial index
+    per large school so school-filtered searches walk a graph that only holds
+    matching rows and still fill top_k. Meant to run after a bulk load, since
+    building on a populated table is far cheaper than maintaining the index row
+    by row.
+    """
+    await drop_vector_indexes(conn)
+
+    if index_type == "none":
+        logger.info("Vector index disabled; searches will use a sequential scan.")
+        return
+
+    start = time.perf_counter()
+    row_count = (await conn.execute(text("SELECT count(*) FROM courses WHERE embedding IS NOT NULL"))).scalar()
+    detail = await _build_index(conn, VECTOR_INDEX_NAME, index_type, row_count=row_count)
+    logger.info(f"Built {index_type} index {VECTOR_INDEX_NAME} ({detail}) in {time.perf_counter() - start:.1f}s")
+
+    # Smaller schools are cheap to scan exactly via the school B-tree index
+    schools = await conn.execute(text(
+        "SELECT school, count(*) FROM courses WHERE embedding IS NOT NULL AND school IS NOT NULL "
+        "GROUP BY school HAVING count(*) >= :min_rows"
+    ), {"min_rows": PARTIAL_INDEX_MIN_ROWS})
+    for school, count in schools.all():
+        if not school.isalnum():
+            continue
+        start = time.perf_counter()
+        name = f"{VECTOR_INDEX_NAME}_school_{school.lower()}"
+        detail = await _build_index(conn, name, index_type, f"school = '{school}'", count)
+        logger.info(f"Built partial {index_type} index {name} ({detail}) in {time.perf_counter() - start:.1f}s")
+
+    await conn.execute(text("ANALYZE courses"))
+
+
+async def _supports_iterative_scan(session) -> bool:
+    """pgvector 0.8+ can keep scanning the index until filtered queries fill LIMIT."""
+    global _iterative_scan
+    if _iterative_scan is None:
+        version = (await session.execute(
+            text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        )).scalar()
+        parts = tuple(int(p) for p in (version or "0").split(".")[:2] if p.isdigit())
+        _iterative_scan = parts >= (0, 8)
+    return _iterative_scan
+
+
+def effective_ef_search(ef_search: Optional[int], limit: int = 0) -> int:
+    """
+    hnsw.ef_search for a query returning `limit` rows. An HNSW scan yields at most
+    ef_search rows, so it is raised to the LIMIT (the whole re-rank pool for
+    quantized indexes) or deeper pages and RERANK_FACTOR would be cut short.
+    """
+    return min(max(int(ef_search or HNSW_EF_SEARCH), candidate_count(limit), 1), MAX_EF_SEARCH)
+
+
+async def apply_search_settings(session, ef_search: Optional[int] = None, probes: Optional[int] = None,
+                                filtered: bool = False, limit: int = 0):
+    """
+    Set the ANN recall knobs for the current transaction only. SET cannot take
+    bind parameters, so values are clamped to ints before being inlined.
+    ef_search is raised to cover `limit` (see effective_ef_search). For filtered
+    queries, and for candidate pools deeper than MAX_EF_SEARCH, iterative index
+    scans (when available) keep the scan going until LIMIT is filled.
+    """
+    ef_search = effective_ef_search(ef_search, limit)
+    probes = min(max(int(probes or IVFFLAT_PROBES), 1), MAX_PROBES)
+    await session.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+    await session.execute(text(f"SET LOCAL ivfflat.probes = {probes}"))
+    too_deep = candidate_count(limit) > ef_search
+    if filtered or too_deep:
+        if await _supports_iterative_scan(session):
+            await session.execute(text("SET LOCAL hnsw.iterative_scan = strict_order"))
+            await session.execute(text("SET LOCAL ivfflat.iterative_scan = relaxed_order"))
+        elif too_deep:
+            logger.warning(f"LIMIT {limit} exceeds MAX_EF_SEARCH={MAX_EF_SEARCH}; HNSW returns at most {ef_search} rows "
+                           f"without pgvector 0.8 iterative scans")
+
+
+async def recall_report(sample_size: int = 100, top_k: int = 20,
+                        ef_search: Optional[int] = None, probes: Optional[int] = None) -> dict:
+    """
+    Compare indexed top-k (through the PGVECTOR_QUANTIZATION search path) against
+    an exact sequential scan, using random course embeddings as queries. Returns
+    mean recall@k and latency for both paths. Re-ranked paths also report the
+    fewest re-rank candidates any query got, which should equal
+    candidate_count(top_k); fewer means the index scan cut the pool short.
+    """
+    async with AsyncSessionLocal() as session:
+        sample = await session.execute(
+            select(Course.embedding).where(Course.embedding.isnot(None)).order_by(text("random()")).limit(sample_size)
+        )
+        queries = [row[0] for row in sample.all()]
+        index_bytes = (await session.execute(
+            text("SELECT coalesce(pg_relation_size(to_regclass(:name)), 0)"), {"name": VECTOR_INDEX_NAME}
+        )).scalar()
+
+    recalls = []
+    candidates = []
+    ann_seconds = 0.0
+    exact_seconds = 0.0
+    for query in queries:
+        stmt = select(Course.code).order_by(Course.embedding.cosine_distance(query)).limit(top_k)
+
+        async with AsyncSessionLocal() as session:
+            await apply_search_settings(session, ef_search, probes, limit=top_k)
+            start = time.perf_counter()
+            ann = [row[0] for row in (await session.execute(vector_search(query, top_k))).all()]
+            ann_seconds += time.perf_counter() - start
+            if reranked():
+                pool = candidate_search(query, top_k).subquery()
+                candidates.append((await session.execute(select(func.count()).select_from(pool))).scalar())
+
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("SET LOCAL enable_indexscan = off"))
+            start = time.perf_counter()
+            exact = [row[0] for row in (await session.execute(stmt)).all()]
+            exact_seconds += time.perf_counter() - start
+
+        if exact:
+            recalls.append(len(set(ann) & set(exact)) / len(exact))
+
+    expected = candidate_count(top_k)
+    if candidates and min(candidates) < expected:
+        logger.warning(f"First pass returned as few as {min(candidates)} of {expected} re-rank candidates")
+
+    n = max(len(queries), 1)
+    return {
+        "queries": len(queries),
+        "top_k": top_k,
+        "ef_search": effective_ef_search(ef_search, top_k),
+        "probes": probes or IVFFLAT_PROBES,
+        "quantization": PGVECTOR_QUANTIZATION,
+        "index_mb": index_bytes / 2**20,
+        "recall_at_k": sum(recalls) / len(recalls) if recalls else 0.0,
+        "min_recall": min(recalls) if recalls else 0.0,
+        "candidates": expected,
+        "min_candidates": min(candidates) if candidates else None,
+        "ann_ms": ann_seconds / n * 1000,
+        "exact_ms": exact_seconds / n * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Manage the courses.embedding ANN index")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--type", default=VECTOR_INDEX_TYPE, choices=["hnsw", "ivfflat", "none"])
+    parser.add_argument("--sample", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--ef-search", type=int, nargs="*", default=[None])
+    parser.add_argument("--probes", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        async with engine.begin() as conn:
+            await create_vector_index(conn, args.type)
+        return
+
+    for ef_search in args.ef_search:
+        report = await recall_report(args.sample, args.top_k, ef_search, args.probes)
+        pool = f"candidates={report['min_candidates']}/{report['candidates']} " if report["min_candidates"] is not None else ""
+        print(
+            f"quantization={report['quantization']} index={report['index_mb']:.1f}MB "
+            f"ef_search={report['ef_search']:<5} probes={report['probes']:<4} "
+            f"recall@{report['top_k']}={report['recall_at_k']:.3f} (min {report['min_recall']:.2f}) {pool}"
+            f"ann={report['ann_ms']:.2f}ms exact={report['exact_ms']:.2f}ms over {report['queries']} queries"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
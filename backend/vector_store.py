@@ -0,0 +1,307 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from backend.prerequisites import parse_prerequisites
+from backend.quantization import (
+    RERANK_FACTOR, truncate_embeddings, int8_codes, binary_codes, int8_scores, hamming_scores
+)
+
+logger = logging.getLogger(__name__)
+
+# Written by scraper/embed.py (or `python -m backend.vector_store export`)
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "scraper/course_vectors.npy")
+VECTOR_STORE_POLL_SECONDS = float(os.getenv("VECTOR_STORE_POLL_SECONDS", "30"))
+META_COLUMNS = ("code", "name", "subject", "description")
+# Matryoshka width of the first-pass scan (same default as the pgvector column).
+# The full-width matrix is always kept for the exact re-rank.
+VECTOR_STORE_DIM = int(os.getenv("VECTOR_STORE_DIM", os.getenv("EMBEDDING_DIM", "768")))
+# "none", "int8" or "binary": compressed codes scanned first, then re-ranked exactly
+VECTOR_STORE_QUANTIZATION = os.getenv("VECTOR_STORE_QUANTIZATION", "none").lower()
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# Same rule as the generated school column in backend/database.py
+_SCHOOL_RE = re.compile(r"^[A-Za-z]+-([A-Za-z]+)")
+
+
+def _school(code: str) -> Optional[str]:
+    match = _SCHOOL_RE.match(code or "")
+    return match.group(1).upper() if match else None
+
+
+def meta_path_for(vectors_path: str) -> str:
+    return os.path.splitext(vectors_path)[0] + ".meta.json"
+
+
+def codes_path_for(vectors_path: str, kind: str) -> str:
+    """Sidecar file for first-pass codes, e.g. "int8-256", "int8-scale-256", "binary-768" or "float-256"."""
+    return os.path.splitext(vectors_path)[0] + f".{kind}.npy"
+
+
+def first_pass_dim(width: int, dim: Optional[int]) -> int:
+    """Width of the first-pass scan; 0/None or anything too wide means the full width."""
+    return dim if dim and dim < width else width
+
+
+def first_pass_kinds(quantization: str, dim: int, width: int) -> Tuple[str, ...]:
+    """Sidecar kinds scanned before the re-rank; empty when the float matrix itself is scanned exactly."""
+    if quantization == "int8":
+        return (f"int8-{dim}", f"int8-scale-{dim}")
+    if quantization == "binary":
+        return (f"binary-{dim}",)
+    return (f"float-{dim}",) if dim < width else ()
+
+
+def first_pass_codes(matrix, quantization: str, dim: int) -> tuple:
+    """First-pass arrays for first_pass_kinds(), built from the full-width matrix."""
+    short = truncate_embeddings(matrix, dim)
+    if quantization == "int8":
+        return int8_codes(short)
+    if quantization == "binary":
+        return (binary_codes(short),)
+    return (short,)
+
+
+def _save_npy(path: str, array: np.ndarray):
+    np.save(path + ".tmp.npy", array)
+    os.replace(path + ".tmp.npy", path)
+
+
+def write_vector_store(courses: List[dict], embeddings, vectors_path: str = VECTOR_STORE_PATH,
+                       dim: Optional[int] = VECTOR_STORE_DIM, quantization: str = VECTOR_STORE_QUANTIZATION):
+    """
+    Write L2-normalized full-width embeddings as a float32 .npy matrix plus
+    column-oriented metadata and the first-pass codes for `dim`/`quantization`
+    (Matryoshka-truncated floats and/or int8/binary codes). Everything else
+    goes first and the matrix is swapped in last, since the matrix's mtime is
+    what running servers watch for reloads.
+    """
+    matrix = truncate_embeddings(embeddings, np.shape(embeddings)[-1])
+    dim = first_pass_dim(matrix.shape[1], dim)
+
+    columns = {col: [c.get(col) for c in courses] for col in META_COLUMNS}
+    meta_path = meta_path_for(vectors_path)
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(columns, f)
+    os.replace(meta_path + ".tmp", meta_path)
+
+    kinds = first_pass_kinds(quantization, dim, matrix.shape[1])
+    if kinds:
+        for kind, array in zip(kinds, first_pass_codes(matrix, quantization, dim)):
+            _save_npy(codes_path_for(vectors_path, kind), array)
+
+    tmp_path = vectors_path + ".tmp.npy"
+    np.save(tmp_path, matrix)
+    os.replace(tmp_path, vectors_path)
+    logger.info(
+        f"Wrote {matrix.shape[0]}x{matrix.shape[1]} vector store to {vectors_path} "
+        f"(first pass: dim={dim}, quantization={quantization})"
+    )
+
+
+class VectorStore:
+    """
+    Brute-force cosine search over a memory-mapped matrix of normalized course
+    embeddings. The OS page cache shares the matrix across every worker process,
+    and top-k is a single matrix-vector product plus argpartition.
+
+    With a narrower `dim` and/or int8 or binary quantization, the compact
+    first-pass codes are scanned instead, and only the best top_k * rerank_factor
+    rows of the full-width float matrix are read to re-rank them exactly.
+    """
+
+    def __init__(self, vectors_path: str = VECTOR_STORE_PATH, quantization: str = VECTOR_STORE_QUANTIZATION,
+                 rerank_factor: int = RERANK_FACTOR, dim: Optional[int] = VECTOR_STORE_DIM):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown VECTOR_STORE_QUANTIZATION: {quantization}")
+        self.vectors_path = vectors_path
+        self.quantization = quantization
+        self.rerank_factor = max(1, rerank_factor)
+        self.dim = dim
+        self.first_pass_dim = None
+        self.matrix = None
+        self.columns = None
+        self.codes = None
+        self._mtime = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.matrix is not None
+
+    def __len__(self):
+        return 0 if self.matrix is None else self.matrix.shape[0]
+
+    def load(self) -> bool:
+        """(Re)load the matrix if the file changed. Returns True if a new matrix was loaded."""
+        try:
+            mtime = os.stat(self.vectors_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+
+        start = time.perf_counter()
+        matrix = np.load(self.vectors_path, mmap_mode="r")
+        with open(meta_path_for(self.vectors_path)) as f:
+            columns = json.load(f)
+        if any(len(columns[col]) != matrix.shape[0] for col in META_COLUMNS):
+            # Writer is mid-swap; pick it up on the next poll
+            logger.warning(f"Vector store metadata does not match {self.vectors_path}; skipping reload")
+            return False
+
+        # Filter columns mirror the school column and course_prerequisites in Postgres
+        columns["school"] = np.array([_school(code) for code in columns["code"]], dtype=object)
+        columns["has_prereqs"] = np.array([parse_prerequisites(d) is not None for d in columns["description"]])
+        columns["subject_array"] = np.array(columns["subject"], dtype=object)
+
+        dim = first_pass_dim(matrix.shape[1], self.dim)
+        codes = self._load_codes(matrix, dim)
+
+        # Swap all references together so in-flight searches see a consistent set
+        self.matrix, self.columns, self.codes, self.first_pass_dim = matrix, columns, codes, dim
+        self._mtime = mtime
+        logger.info(
+            f"Loaded vector store {matrix.shape[0]}x{matrix.shape[1]} {matrix.dtype} "
+            f"(first pass: dim={dim}, quantization={self.quantization}) in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+        return True
+
+    def _load_codes(self, matrix, dim: int):
+        """Memory-map the first-pass codes written next to the matrix, or derive them from it."""
+        kinds = first_pass_kinds(self.quantization, dim, matrix.shape[1])
+        if not kinds:
+            return None
+        paths = [codes_path_for(self.vectors_path, kind) for kind in kinds]
+        try:
+            arrays = [np.load(path, mmap_mode="r") for path in paths]
+            if arrays[0].shape[0] == matrix.shape[0]:
+                return tuple(arrays)
+            logger.warning(f"{paths[0]} does not match {self.vectors_path}; rebuilding codes in memory")
+        except FileNotFoundError:
+            logger.warning(f"{paths[0]} not found; building first-pass codes in memory")
+        return first_pass_codes(matrix, self.quantization, dim)
+
+    def memory_bytes(self) -> dict:
+        """Size of the float matrix and of the codes scanned on every query."""
+        matrix = 0 if self.matrix is None else self.matrix.nbytes
+        codes = sum(array.nbytes for array in self.codes) if self.codes is not None else 0
+        return {"matrix": matrix, "codes": codes, "scanned": codes or matrix}
+
+    async def watch(self, interval: float = VECTOR_STORE_POLL_SECONDS):
+        """Poll for a new matrix file and hot-swap it in."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.load)
+            except Exception as e:
+                logger.error(f"Vector store reload failed: {e}")
+
+    def start_watching(self):
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self.watch())
+
+    async def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    def _filter_mask(self, columns, subject, school, has_prereqs) -> Optional[np.ndarray]:
+        mask = None
+        if subject:
+            mask = columns["subject_array"] == subject
+        if school:
+            school_mask = columns["school"] == school
+            mask = school_mask if mask is None else mask & school_mask
+        if has_prereqs is not None:
+            prereq_mask = columns["has_prereqs"] == has_prereqs
+            mask = prereq_mask if mask is None else mask & prereq_mask
+        return mask
+
+    def search(self, query, top_k: int, subject: Optional[str] = None, school: Optional[str] = None,
+               has_prereqs: Optional[bool] = None) -> List[Tuple[dict, float]]:
+        """
+        Return (course metadata, cosine similarity) pairs, best first. Filters are
+        applied before top-k selection, so a filtered search still fills top_k.
+        """
+        matrix, columns, codes, dim = self.matrix, self.columns, self.codes, self.first_pass_dim
+        if matrix is None:
+            raise RuntimeError("Vector store not loaded")
+
+        query = truncate_embeddings(query, matrix.shape[1])
+        if codes is None:
+            scores = matrix @ query
+        else:
+            # The first pass sees the query truncated the same way its codes were
+            short_query = truncate_embeddings(query, dim)
+            if self.quantization == "int8":
+                scores = int8_scores(codes[0], codes[1], short_query)
+            elif self.quantization == "binary":
+                scores = hamming_scores(codes[0], short_query)
+            else:
+                scores = codes[0] @ short_query
+
+        mask = self._filter_mask(columns, subject, school, has_prereqs)
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(scores.shape[0])
+        if mask is not None:
+            scores = scores[rows]
+
+        if codes is not None:
+            # Exact full-width re-rank of the shortlist; only these rows of the matrix are paged in
+            shortlist = rows[_top(scores, top_k * self.rerank_factor)]
+            shortlist.sort()
+            rows = shortlist
+            scores = matrix[rows] @ query
+
+        top = _top(scores, top_k)
+        return [
+            ({col: columns[col][row] for col in META_COLUMNS}, float(score))
+            for row, score in zip(rows[top], scores[top])
+        ]
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+async def export_from_db(vectors_path: str = VECTOR_STORE_PATH, quantization: str = VECTOR_STORE_QUANTIZATION):
+    """Build the vector store from the courses table for already-populated databases."""
+    from sqlalchemy.future import select
+    from backend.database import AsyncSessionLocal, Course
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Course.code, Course.name, Course.subject, Course.description, Course.embedding)
+            .where(Course.embedding.isnot(None))
+        )
+        rows = result.all()
+
+    courses = [{"code": r[0], "name": r[1], "subject": r[2], "description": r[3]} for r in rows]
+    write_vector_store(courses, [r[4] for r in rows], vectors_path, quantization=quantization)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export course embeddings to the in-memory vector store format")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--path", default=VECTOR_STORE_PATH)
+    parser.add_argument("--quantization", default=VECTOR_STORE_QUANTIZATION, choices=QUANTIZATIONS)
+    args = parser.parse_args()
+    asyncio.run(export_from_db(args.path, args.quantization))
@@ -1,8 +1,16 @@
 import os
 import json
+import hashlib
+import argparse
 import logging
+from typing import Iterator, List
+import numpy as np
 from sentence_transformers import SentenceTransformer
 import warnings
+from backend.vector_store import write_vector_store
+from backend.embedding_files import (
+    EMBEDDINGS_FILE, METADATA_FILE, MANIFEST_FILE, read_manifest, write_manifest, load_vectors, iter_metadata
+)
 warnings.filterwarnings('ignore', category=UserWarning)
 
 # Setup basic logging
@@ -12,47 +20,231 @@ logger = logging.getLogger(__name__)
 # Model to use: Nomic AI Text v1.5
 MODEL_NAME = "nomic-ai/nomic-embed-text-v1.5"
 
+# scrape.py streams JSONL; courses_raw.json is the older single-array output
+INPUT_FILE = "scraper/courses_raw.jsonl"
+LEGACY_INPUT_FILE = "scraper/courses_raw.json"
+# Courses encoded (and checkpointed) per chunk; batch size is per model forward pass
+CHUNK_SIZE = int(os.getenv("EMBED_CHUNK_SIZE", "1024"))
+BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+METADATA_FIELDS = ("code", "name", "subject", "description")
+
 def load_data(filepath: str):
     logger.info(f"Loading data from {filepath}")
     with open(filepath, 'r') as f:
         return json.load(f)
 
-def generate_embeddings():
-    input_file = "scraper/courses_raw.json"
-    output_file = "scraper/courses_embedded.json"
-    
+def iter_courses(filepath: str) -> Iterator[dict]:
+    """Yield raw courses from a JSON array or, for .jsonl input, one line at a time."""
+    if filepath.endswith(".jsonl"):
+        with open(filepath) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from load_data(filepath)
+
+def document_text(course: dict) -> str:
+    # Optional: we can combine code, name, and description to give richer semantic context
+    return f"search_document: Course Code: {course['code']} Name: {course.get('name', '')} Subject: {course.get('subject', '')} Description: {course.get('description', '')}"
+
+def input_fingerprint(filepath: str) -> dict:
+    stat = os.stat(filepath)
+    return {"path": filepath, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def resume_point(manifest, fingerprint: dict) -> int:
+    """Number of courses already embedded from this exact input, or 0 to start over."""
+    if not manifest or manifest.get("input") != fingerprint or manifest.get("model") != MODEL_NAME:
+        return 0
+    return manifest["count"]
+
+def truncate_outputs(done: int, dim: int):
+    """Drop anything written after the last checkpoint (e.g. a chunk cut off by a crash)."""
+    with open(EMBEDDINGS_FILE, 'r+b') as f:
+        f.truncate(done * dim * 4)
+    with open(METADATA_FILE, 'r+') as f:
+        for _ in range(done):
+            f.readline()
+        f.truncate(f.tell())
+
+def chunked(items: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def content_hash(text: str) -> str:
+    """Hash of the exact text fed to the model; equal hashes mean the vector can be reused."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def previous_path(path: str) -> str:
+    return path + ".prev"
+
+def rotate_previous_outputs(manifest):
+    """Keep the last completed run around as the reuse reference while the new one is written."""
+    if manifest and manifest.get("complete"):
+        for path in (EMBEDDINGS_FILE, METADATA_FILE, MANIFEST_FILE):
+            os.replace(path, previous_path(path))
+
+def load_reference():
+    """Map content hash -> vector row (and code -> hash) from the previous completed run."""
+    manifest = read_manifest(previous_path(MANIFEST_FILE))
+    if manifest is None or manifest.get("model") != MODEL_NAME:
+        return None, {}, {}
+    vectors = load_vectors(manifest, previous_path(EMBEDDINGS_FILE))
+    by_hash, code_hashes = {}, {}
+    for i, meta in enumerate(iter_metadata(previous_path(METADATA_FILE), manifest["count"])):
+        # Outputs from before hashes were recorded are hashed from their metadata
+        h = meta.get("content_hash") or content_hash(document_text(meta))
+        by_hash.setdefault(h, i)
+        code_hashes[meta["code"]] = h
+    return vectors, by_hash, code_hashes
+
+def remove_previous_outputs():
+    for path in (EMBEDDINGS_FILE, METADATA_FILE, MANIFEST_FILE):
+        if os.path.exists(previous_path(path)):
+            os.remove(previous_path(path))
+
+def change_report(code_hashes: dict) -> dict:
+    """Compare the finished run against the reference run by course code."""
+    report = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0}
+    seen = set()
+    for meta in iter_metadata():
+        seen.add(meta["code"])
+        old = code_hashes.get(meta["code"])
+        if old is None:
+            report["added"] += 1
+        elif old == meta["content_hash"]:
+            report["unchanged"] += 1
+        else:
+            report["changed"] += 1
+    report["removed"] = len(set(code_hashes) - seen)
+    return report
+
+def generate_embeddings(chunk_size: int = CHUNK_SIZE, batch_size: int = BATCH_SIZE,
+                        threads: int = 0, restart: bool = False, full: bool = False,
+                        input_file: str = INPUT_FILE):
     if not os.path.exists(input_file):
         logger.error(f"Input file {input_file} not found. Please run scrape.py first.")
         return
-        
-    courses = load_data(input_file)
-    if not courses:
-        logger.warning("No courses loaded.")
+
+    if threads:
+        # Keep CPU-only hosts from oversubscribing cores
+        import torch
+        torch.set_num_threads(threads)
+
+    fingerprint = input_fingerprint(input_file)
+    manifest = None if restart else read_manifest()
+    done = resume_point(manifest, fingerprint)
+
+    if manifest and manifest.get("complete") and done:
+        logger.info(f"{done} courses already embedded from {input_file}; use --restart to redo them.")
         return
-        
-    logger.info(f"Loaded {len(courses)} courses. Loading model...")
-    # Nomic embed model requires mean pooling (which sentence-transformers handles) and prefix
-    # According to Nomic docs: "search_document" is the prefix for general document embedding
-    model = SentenceTransformer(MODEL_NAME, trust_remote_code=True)
-    
-    logger.info(f"Generating embeddings for {len(courses)} courses...")
-    
-    # Optional: we can combine code, name, and description to give richer semantic context
-    textsToEmbed = [
-        f"search_document: Course Code: {c['code']} Name: {c.get('name', '')} Subject: {c.get('subject', '')} Description: {c.get('description', '')}"
-        for c in courses
-    ]
-    
-    embeddings = model.encode(textsToEmbed, convert_to_tensor=False, show_progress_bar=True)
-    
-    logger.info("Embeddings generated. Saving to file...")
-    for idx, course in enumerate(courses):
-        course['embedding'] = embeddings[idx].tolist()
-        
-    with open(output_file, 'w') as f:
-        json.dump(courses, f)
-        
-    logger.info(f"Saved {len(courses)} embedded courses to {output_file}")
+
+    if not done and not full:
+        rotate_previous_outputs(read_manifest())
+    if not full and os.path.exists(previous_path(MANIFEST_FILE)):
+        ref_vectors, ref_by_hash, ref_code_hashes = load_reference()
+        if ref_vectors is not None:
+            logger.info(f"Reusing vectors from previous run ({len(ref_by_hash)} distinct texts).")
+    else:
+        ref_vectors, ref_by_hash, ref_code_hashes = None, {}, {}
+
+    model = None
+    dim = ref_vectors.shape[1] if ref_vectors is not None else None
+
+    def load_model():
+        logger.info("Loading model...")
+        # Nomic embed model requires mean pooling (which sentence-transformers handles) and prefix
+        # According to Nomic docs: "search_document" is the prefix for general document embedding
+        return SentenceTransformer(MODEL_NAME, trust_remote_code=True)
+
+    if dim is None:
+        model = load_model()
+        dim = model.get_sentence_embedding_dimension()
+
+    if done:
+        logger.info(f"Resuming from checkpoint: {done} courses already embedded.")
+        truncate_outputs(done, dim)
+        mode = 'a'
+    else:
+        mode = 'w'
+
+    manifest = {"model": MODEL_NAME, "dim": dim, "dtype": "float32", "input": fingerprint,
+                "count": done, "complete": False}
+    write_manifest(manifest)
+
+    courses = iter_courses(input_file)
+    for _ in range(done):
+        next(courses)
+
+    encoded = 0
+    with open(EMBEDDINGS_FILE, mode + 'b') as vec_f, open(METADATA_FILE, mode) as meta_f:
+        for chunk in chunked(courses, chunk_size):
+            texts = [document_text(c) for c in chunk]
+            hashes = [content_hash(t) for t in texts]
+            vectors = np.empty((len(chunk), dim), dtype=np.float32)
+
+            missing = []
+            for i, h in enumerate(hashes):
+                row = ref_by_hash.get(h)
+                if row is None:
+                    missing.append(i)
+                else:
+                    vectors[i] = ref_vectors[row]
+
+            if missing:
+                if model is None:
+                    model = load_model()
+                vectors[missing] = model.encode(
+                    [texts[i] for i in missing],
+                    batch_size=batch_size, convert_to_tensor=False, show_progress_bar=False
+                )
+                encoded += len(missing)
+
+            vec_f.write(vectors.tobytes())
+            for c, h in zip(chunk, hashes):
+                meta = {k: c.get(k) for k in METADATA_FIELDS}
+                meta["content_hash"] = h
+                meta_f.write(json.dumps(meta) + "\n")
+            vec_f.flush()
+            meta_f.flush()
+            os.fsync(vec_f.fileno())
+            os.fsync(meta_f.fileno())
+
+            # Checkpoint only after the chunk is durably on disk
+            manifest["count"] += len(chunk)
+            write_manifest(manifest)
+            logger.info(f"Embedded {manifest['count']} courses ({encoded} through the model)...")
+
+    manifest["complete"] = True
+    write_manifest(manifest)
+    logger.info(f"Saved {manifest['count']} embedded courses to {EMBEDDINGS_FILE} and {METADATA_FILE}")
+
+    if ref_code_hashes:
+        report = change_report(ref_code_hashes)
+        logger.info(
+            f"Changes since previous run: {report['added']} added, {report['changed']} changed, "
+            f"{report['removed']} removed, {report['unchanged']} unchanged"
+        )
+    del ref_vectors
+    remove_previous_outputs()
+
+    # Memory-mapped matrix for the in-process search backend (SEARCH_BACKEND=numpy)
+    write_vector_store(list(iter_metadata()), load_vectors(manifest))
 
 if __name__ == "__main__":
-    generate_embeddings()
+    parser = argparse.ArgumentParser(description="Embed scraped courses with Nomic")
+    default_input = INPUT_FILE if os.path.exists(INPUT_FILE) or not os.path.exists(LEGACY_INPUT_FILE) else LEGACY_INPUT_FILE
+    parser.add_argument("--input", default=default_input)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="courses per checkpoint")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="texts per forward pass")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("EMBED_THREADS", "0")),
+                        help="torch intra-op threads (0 = library default)")
+    parser.add_argument("--restart", action="store_true", help="ignore any checkpoint and start over")
+    parser.add_argument("--full", action="store_true", help="re-embed every course instead of reusing unchanged vectors")
+    args = parser.parse_args()
+    generate_embeddings(args.chunk_size, args.batch_size, args.threads, args.restart, args.full, args.input)
@@ -1,10 +1,25 @@
+import argparse
 import asyncio
 import aiohttp
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import json
 import logging
 import os
-from typing import List, Dict
+import random
+import time
+from typing import List, Dict, Optional, Tuple
+
+# selectolax parses course pages several times faster than BeautifulSoup; lxml
+# is the next best backend for BeautifulSoup itself. Both are optional.
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+try:
+    import lxml  # noqa: F401
+    BS4_PARSER = "lxml"
+except ImportError:
+    BS4_PARSER = "html.parser"
 
 # Setup basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,18 +28,132 @@ logger = logging.getLogger(__name__)
 BASE_URL = "https://bulletins.nyu.edu"
 COURSES_URL = f"{BASE_URL}/courses/"
 
-async def fetch_page(session: aiohttp.ClientSession, url: str) -> str:
-    """Fetches a page asynchronously."""
-    async with session.get(url, ssl=False) as response:
-        response.raise_for_status()
-        return await response.text()
+# One JSON course per line, written as subjects finish (scraper/embed.py reads .jsonl)
+OUTPUT_FILE = "scraper/courses_raw.jsonl"
+# ETag/Last-Modified per subject URL, and each subject's parsed courses, for conditional re-crawls
+STATE_FILE = "scraper/crawl_state.json"
+SUBJECT_CACHE_DIR = "scraper/subject_cache"
+
+# Bounds for the adaptive concurrency limit, and the page latency above which it backs off
+CRAWL_INITIAL_CONCURRENCY = int(os.getenv("CRAWL_INITIAL_CONCURRENCY", "4"))
+CRAWL_MIN_CONCURRENCY = int(os.getenv("CRAWL_MIN_CONCURRENCY", "1"))
+CRAWL_MAX_CONCURRENCY = int(os.getenv("CRAWL_MAX_CONCURRENCY", "16"))
+CRAWL_TARGET_LATENCY = float(os.getenv("CRAWL_TARGET_LATENCY", "2.0"))
+CRAWL_RETRIES = int(os.getenv("CRAWL_RETRIES", "3"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "30"))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit, as in TCP congestion control. Every fast response
+    adds 1/limit slots (about one more per round of requests); a 429/5xx,
+    timeout or response slower than `target_latency` halves the limit, at most
+    once per `target_latency` so one burst of failures counts as one signal.
+    Retry-After pauses new requests.
+    """
+
+    def __init__(self, initial: int = CRAWL_INITIAL_CONCURRENCY, minimum: int = CRAWL_MIN_CONCURRENCY,
+                 maximum: int = CRAWL_MAX_CONCURRENCY, target_latency: float = CRAWL_TARGET_LATENCY):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._changed = asyncio.Condition()
+        self._last_decrease = 0.0
+
+        self.peak = self.limit
+        self.decreases = 0
+
+    async def acquire(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self):
+        async with self._changed:
+            self.in_flight -= 1
+            self._changed.notify_all()
+
+    def on_success(self, latency: float):
+        if latency > self.target_latency:
+            self._decrease(f"{latency:.1f}s response")
+            return
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self.peak = max(self.peak, self.limit)
+
+    def on_overload(self, reason: str, retry_after: Optional[float] = None):
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        self._decrease(reason)
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < self.target_latency:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit / 2)
+        self.decreases += 1
+        logger.info(f"Backing off to {int(self.limit)} concurrent requests ({reason})")
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+async def fetch_page(session: aiohttp.ClientSession, url: str, limiter: AdaptiveLimiter,
+                     validators: Optional[dict] = None) -> Tuple[Optional[str], dict]:
+    """
+    Fetches a page asynchronously, conditionally if `validators` (etag/last_modified)
+    are given. Returns (html, validators); html is None when the page is unchanged (304).
+    429/5xx and connection errors are retried with backoff and slow the limiter down.
+    """
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    error = None
+    for attempt in range(CRAWL_RETRIES + 1):
+        await limiter.acquire()
+        start = time.monotonic()
+        try:
+            async with session.get(url, headers=headers, ssl=False) as response:
+                if response.status == 429 or response.status >= 500:
+                    error = f"HTTP {response.status}"
+                    limiter.on_overload(error, _retry_after(response))
+                else:
+                    html = None
+                    if response.status != 304:
+                        response.raise_for_status()
+                        html = await response.text()
+                    limiter.on_success(time.monotonic() - start)
+                    return html, {
+                        "etag": response.headers.get("ETag") or (validators or {}).get("etag"),
+                        "last_modified": response.headers.get("Last-Modified") or (validators or {}).get("last_modified"),
+                    }
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            error = repr(e)
+            limiter.on_overload(error)
+        finally:
+            await limiter.release()
+        if attempt < CRAWL_RETRIES:
+            await asyncio.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+    raise RuntimeError(f"{url}: {error}")
+
+
+def parse_subjects(html: str) -> List[Dict[str, str]]:
+    soup = BeautifulSoup(html, BS4_PARSER, parse_only=SoupStrainer('a'))
 
-async def get_course_subjects(session: aiohttp.ClientSession) -> List[Dict[str, str]]:
-    """Scrapes the main courses page to get all subject URLs."""
-    logger.info(f"Fetching main courses page: {COURSES_URL}")
-    html = await fetch_page(session, COURSES_URL)
-    soup = BeautifulSoup(html, 'html.parser')
-    
     subjects = []
     # Find all links that go to /courses/
     links = soup.find_all('a')
@@ -38,70 +167,168 @@ async def get_course_subjects(session: aiohttp.ClientSession) -> List[Dict[str,
                     "name": name,
                     "url": f"{BASE_URL}{href}"
                 })
-    
+
     # Deduplicate subjects based on URL
     unique_subjects = {s['url']: s for s in subjects}.values()
     return list(unique_subjects)
 
-async def get_courses_for_subject(session: aiohttp.ClientSession, subject: Dict[str, str]) -> List[Dict[str, str]]:
-    """Scrapes all courses for a specific subject."""
-    logger.info(f"Fetching courses for subject: {subject['name']}")
+
+def parse_courses(html: str, subject_name: str) -> List[Dict[str, str]]:
+    """Courses from the div.courseblock elements of a subject page."""
+    if HTMLParser is not None:
+        blocks = [
+            (b.css_first('span.detail-code'), b.css_first('span.detail-title'), b.css_first('div.courseblockextra'))
+            for b in HTMLParser(html).css('div.courseblock')
+        ]
+        text = lambda node: node.text()
+    else:
+        # Only courseblocks are built into the tree
+        soup = BeautifulSoup(html, BS4_PARSER, parse_only=SoupStrainer('div', class_='courseblock'))
+        blocks = [
+            (b.find('span', class_='detail-code'), b.find('span', class_='detail-title'), b.find('div', class_='courseblockextra'))
+            for b in soup.find_all('div', class_='courseblock')
+        ]
+        text = lambda node: node.text
+
+    courses = []
+    for code_span, title_span, desc_div in blocks:
+        if code_span and title_span:
+            courses.append({
+                "code": text(code_span).strip(),
+                "name": text(title_span).strip(),
+                "description": text(desc_div).strip() if desc_div else "",
+                "subject": subject_name
+            })
+    return courses
+
+
+class CrawlState:
+    """
+    Validators (ETag/Last-Modified) per subject URL and a JSONL copy of each
+    subject's parsed courses, so an unchanged page (304) is re-emitted from disk
+    without downloading or parsing it.
+    """
+
+    def __init__(self, path: str = STATE_FILE, cache_dir: str = SUBJECT_CACHE_DIR):
+        self.path = path
+        self.cache_dir = cache_dir
+        try:
+            with open(path) as f:
+                self.subjects = json.load(f)
+        except FileNotFoundError:
+            self.subjects = {}
+
+    def cache_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, url.rstrip('/').rsplit('/', 1)[-1] + ".jsonl")
+
+    def validators(self, url: str) -> Optional[dict]:
+        # Without the cached courses a 304 would leave nothing to emit
+        if url in self.subjects and os.path.exists(self.cache_path(url)):
+            return self.subjects[url]
+        return None
+
+    def cached_lines(self, url: str) -> List[str]:
+        with open(self.cache_path(url)) as f:
+            return f.readlines()
+
+    def store(self, url: str, validators: dict, lines: List[str]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.cache_path(url)
+        with open(path + ".tmp", 'w') as f:
+            f.writelines(lines)
+        os.replace(path + ".tmp", path)
+        self.subjects[url] = validators
+
+    def save(self, urls):
+        """Persist validators for the subjects still listed, dropping the rest."""
+        self.subjects = {url: v for url, v in self.subjects.items() if url in urls}
+        with open(self.path + ".tmp", 'w') as f:
+            json.dump(self.subjects, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+
+
+async def get_course_subjects(session: aiohttp.ClientSession, limiter: AdaptiveLimiter) -> List[Dict[str, str]]:
+    """Scrapes the main courses page to get all subject URLs."""
+    logger.info(f"Fetching main courses page: {COURSES_URL}")
+    html, _ = await fetch_page(session, COURSES_URL, limiter)
+    return parse_subjects(html)
+
+async def get_courses_for_subject(session: aiohttp.ClientSession, limiter: AdaptiveLimiter,
+                                  subject: Dict[str, str], state: CrawlState, full: bool = False) -> Tuple[str, List[str]]:
+    """
+    Course JSON lines for one subject and whether the page "changed", was
+    "unchanged" (304, served from the subject cache) or "failed" (the last
+    cached copy, if any, is kept so the subject doesn't drop out of the catalog).
+    """
+    url = subject['url']
+    validators = None if full else state.validators(url)
     try:
-        html = await fetch_page(session, subject['url'])
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        courses = []
-        # Find the courseblocks
-        course_blocks = soup.find_all('div', class_='courseblock')
-        for block in course_blocks:
-            code_span = block.find('span', class_='detail-code')
-            title_span = block.find('span', class_='detail-title')
-            desc_div = block.find('div', class_='courseblockextra')
-            
-            if code_span and title_span:
-                code = code_span.text.strip()
-                name = title_span.text.strip()
-                desc = desc_div.text.strip() if desc_div else ""
-                
-                courses.append({
-                    "code": code,
-                    "name": name,
-                    "description": desc,
-                    "subject": subject['name']
-                })
-                
-        return courses
+        html, new_validators = await fetch_page(session, url, limiter, validators)
+        if html is None:
+            return "unchanged", state.cached_lines(url)
+        # CPU-bound; keeps the event loop free for the other downloads
+        courses = await asyncio.to_thread(parse_courses, html, subject['name'])
+        lines = [json.dumps(course) + "\n" for course in courses]
+        state.store(url, new_validators, lines)
+        logger.info(f"Fetched {len(courses)} courses for subject: {subject['name']}")
+        return "changed", lines
     except Exception as e:
         logger.error(f"Failed to fetch or parse {subject['name']}: {e}")
-        return []
+        cached = os.path.exists(state.cache_path(url))
+        return "failed", state.cached_lines(url) if cached else []
+
+async def scrape_all_courses(output: str = OUTPUT_FILE, full: bool = False,
+                             limiter: Optional[AdaptiveLimiter] = None) -> Dict[str, int]:
+    """
+    Crawl every subject with adaptive concurrency, streaming courses to `output`
+    as each subject finishes. Unchanged pages cost one conditional GET. If no
+    subject changed, `output` is left untouched so embed.py sees nothing new.
+    """
+    limiter = limiter or AdaptiveLimiter()
+    state = CrawlState()
+    previous_urls = set(state.subjects)
+    counts = {"changed": 0, "unchanged": 0, "failed": 0, "courses": 0}
+    start = time.perf_counter()
 
-async def scrape_all_courses() -> List[Dict[str, str]]:
-    """Main function to scrape all subjects and courses."""
-    async with aiohttp.ClientSession() as session:
-        subjects = await get_course_subjects(session)
+    timeout = aiohttp.ClientTimeout(total=CRAWL_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=limiter.maximum)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        subjects = await get_course_subjects(session, limiter)
         logger.info(f"Found {len(subjects)} subjects. Starting to scrape courses...")
-        
-        all_courses = []
-        # Process subjects in batches to avoid overwhelming the server
-        batch_size = 10
-        for i in range(0, len(subjects), batch_size):
-            batch = subjects[i:i + batch_size]
-            tasks = [get_courses_for_subject(session, sub) for sub in batch]
-            results = await asyncio.gather(*tasks)
-            for res in results:
-                all_courses.extend(res)
-            # Small delay between batches
-            await asyncio.sleep(1)
-            logger.info(f"Processed {min(i + batch_size, len(subjects))}/{len(subjects)} subjects...")
-            
-        return all_courses
+
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output + ".tmp", 'w') as out:
+            async def crawl(subject):
+                status, lines = await get_courses_for_subject(session, limiter, subject, state, full)
+                out.writelines(lines)
+                counts[status] += 1
+                counts["courses"] += len(lines)
+                done = counts["changed"] + counts["unchanged"] + counts["failed"]
+                if done % 50 == 0:
+                    logger.info(f"Processed {done}/{len(subjects)} subjects (concurrency {int(limiter.limit)})...")
+
+            await asyncio.gather(*(crawl(subject) for subject in subjects))
+
+    urls = {s['url'] for s in subjects}
+    state.save(urls)
+    if counts["changed"] == 0 and counts["failed"] == 0 and urls == previous_urls and os.path.exists(output):
+        os.remove(output + ".tmp")
+        logger.info(f"No subject pages changed; kept {output}")
+    else:
+        os.replace(output + ".tmp", output)
+
+    logger.info(
+        f"Scraped {len(subjects)} subjects in {time.perf_counter() - start:.1f}s: {counts['changed']} changed, "
+        f"{counts['unchanged']} unchanged, {counts['failed']} failed; {counts['courses']} courses. "
+        f"Concurrency peaked at {int(limiter.peak)} with {limiter.decreases} back-offs."
+    )
+    return counts
 
 if __name__ == "__main__":
-    courses = asyncio.run(scrape_all_courses())
-    logger.info(f"Total courses scraped: {len(courses)}")
-    
-    # Save to file temporarily as our database representation/seed
-    os.makedirs('scraper', exist_ok=True)
-    with open('scraper/courses_raw.json', 'w') as f:
-        json.dump(courses, f, indent=2)
-    logger.info("Saved raw courses to scraper/courses_raw.json")
+    parser = argparse.ArgumentParser(description="Crawl the NYU course bulletin into scraper/courses_raw.jsonl")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--full", action="store_true", help="ignore stored ETags and re-download every subject")
+    parser.add_argument("--max-concurrency", type=int, default=CRAWL_MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    asyncio.run(scrape_all_courses(args.output, args.full, AdaptiveLimiter(maximum=args.max_concurrency)))
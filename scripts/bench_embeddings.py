@@ -0,0 +1,129 @@
+"""
+Memory / latency / recall@k for Matryoshka widths and quantized first passes of
+the in-memory vector store (each re-ranked on the full-width float32 matrix),
+measured against an exact full-width float32 scan.
+
+Run from the repo root after scraper/embed.py:
+    PYTHONPATH=. python scripts/bench_embeddings.py --dims 768 512 256 --json bench.json
+Without embedding files, --synthetic N benchmarks N random clustered vectors.
+Queries are catalog vectors plus noise, a stand-in for real query embeddings.
+
+The pgvector equivalent is `python -m backend.vector_index report`, run once per
+PGVECTOR_QUANTIZATION / EMBEDDING_DIM setting after `populate --reindex`.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from backend.embedding_files import read_manifest, load_vectors
+from backend.quantization import truncate_embeddings
+from backend.vector_store import VectorStore, write_vector_store
+
+
+def synthetic_catalog(rows: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(rows // 50, 1), dim)).astype(np.float32)
+    return centers[rng.integers(0, centers.shape[0], rows)] + 0.6 * rng.normal(size=(rows, dim)).astype(np.float32)
+
+
+def percentile(values, pct: float) -> float:
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def run_setting(embeddings, courses, queries, truth, top_k, dim, quantization, rerank_factor, workdir):
+    path = os.path.join(workdir, f"bench_{dim}_{quantization}.npy")
+    write_vector_store(courses, embeddings, path, dim=dim, quantization=quantization)
+    store = VectorStore(path, quantization=quantization, rerank_factor=rerank_factor, dim=dim)
+    store.load()
+
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = store.search(query, top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {int(meta["code"]) for meta, _ in hits}
+        recalls.append(len(found & expected) / len(expected))
+
+    memory = store.memory_bytes()
+    return {
+        "dim": store.first_pass_dim,
+        "quantization": quantization,
+        "rerank_factor": rerank_factor if store.codes is not None else None,
+        "matrix_mb": memory["matrix"] / 2**20,
+        "scanned_mb": memory["scanned"] / 2**20,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "recall_at_k": float(np.mean(recalls)),
+        "min_recall": float(np.min(recalls)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--synthetic", type=int, default=0, help="benchmark N random vectors instead of the catalog")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--dims", type=int, nargs="*", default=[768, 512, 256, 128])
+    parser.add_argument("--rerank-factors", type=int, nargs="*", default=[1, 4, 10])
+    parser.add_argument("--noise", type=float, default=0.3, help="relative noise added to sampled query vectors")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        embeddings = synthetic_catalog(args.synthetic, 768)
+    else:
+        manifest = read_manifest()
+        if not manifest or not manifest.get("complete"):
+            parser.error("no completed embedding run found; run scraper/embed.py or pass --synthetic N")
+        embeddings = np.asarray(load_vectors(manifest), dtype=np.float32)
+    # Row numbers as codes make recall a set comparison
+    courses = [{"code": str(i)} for i in range(embeddings.shape[0])]
+
+    rng = np.random.default_rng(1)
+    sample = embeddings[rng.choice(embeddings.shape[0], min(args.queries, embeddings.shape[0]), replace=False)]
+    scale = np.linalg.norm(sample, axis=1, keepdims=True) / np.sqrt(sample.shape[1])
+    queries = sample + args.noise * scale * rng.normal(size=sample.shape).astype(np.float32)
+
+    # Ground truth: exact cosine over the full-width float32 vectors
+    reference = truncate_embeddings(embeddings, embeddings.shape[1])
+    truth = []
+    for query in queries:
+        scores = reference @ truncate_embeddings(query, reference.shape[1])
+        truth.append(set(np.argpartition(-scores, args.top_k - 1)[:args.top_k].tolist()))
+
+    settings = []
+    width = embeddings.shape[1]
+    for dim in args.dims:
+        for quantization in ("none", "int8", "binary"):
+            if quantization == "none" and dim >= width:
+                # Exact scan of the full matrix; nothing to re-rank
+                settings.append((dim, quantization, 1))
+                continue
+            for factor in args.rerank_factors:
+                settings.append((dim, quantization, factor))
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for dim, quantization, factor in settings:
+            result = run_setting(embeddings, courses, queries, truth, args.top_k,
+                                 dim, quantization, factor, workdir)
+            results.append(result)
+            print(
+                f"dim={result['dim']:<4} {quantization:<6} rerank={str(result['rerank_factor']):<4} "
+                f"scanned={result['scanned_mb']:8.2f}MB matrix={result['matrix_mb']:8.2f}MB "
+                f"p50={result['p50_ms']:6.2f}ms p95={result['p95_ms']:6.2f}ms "
+                f"recall@{args.top_k}={result['recall_at_k']:.3f} (min {result['min_recall']:.2f})"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": embeddings.shape[0], "queries": len(queries), "top_k": args.top_k,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Local stand-in for the NYU Class Search (FOSE) API with injectable latency.
+
+Run standalone:   python scripts/fake_fose_server.py --port 8081 --latency 0.3
+then point the backend at it with FOSE_BASE_URL=http://127.0.0.1:8081/class-search/api/
+"""
+import argparse
+import asyncio
+import random
+from aiohttp import web
+
+# course code -> {term: [instructors]}
+DEFAULT_CATALOG = {
+    "CSCI-UA 473": {"1254": ["Jane Doe"], "1252": ["Jane Doe", "John Roe"], "1248": ["Ada Lovelace"],
+                    "1244": ["Alan Turing"], "1240": ["Grace Hopper"]},
+    "HOU-UF 9101": {"1248": ["Staff"]},
+}
+
+DEFAULT_DESCRIPTION = (
+    "An introduction to machine learning. Prerequisites: CSCI-UA 310 and MATH-UA 140. "
+    "Students build models from data."
+)
+
+
+class FakeFose:
+    def __init__(self, catalog=None, latency: float = 0.2, jitter: float = 0.0, term_latency=None,
+                 error_rate: float = 0.0, description: str = DEFAULT_DESCRIPTION):
+        self.catalog = catalog if catalog is not None else DEFAULT_CATALOG
+        self.latency = latency
+        self.jitter = jitter
+        # Optional per-term override, e.g. {"1238": 5.0} to simulate one slow term
+        self.term_latency = term_latency or {}
+        self.error_rate = error_rate
+        self.description = description
+        self.requests = {"search": 0, "details": 0}
+
+    async def _delay(self, term: str):
+        delay = self.term_latency.get(term, self.latency) + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        route = request.query.get("route")
+        body = await request.json()
+        if route == "search":
+            self.requests["search"] += 1
+            term = body["other"]["srcdb"]
+            await self._delay(term)
+            if random.random() < self.error_rate:
+                return web.json_response({"fatal": "injected error"}, status=503)
+            keyword = body["criteria"][0]["value"]
+            instructors = self.catalog.get(keyword, {}).get(term)
+            if instructors is None:
+                return web.json_response({"results": []})
+            results = [
+                {"code": keyword, "key": str(i + 1), "crn": str(10000 + i), "srcdb": term, "instr": instr}
+                for i, instr in enumerate(instructors)
+            ]
+            return web.json_response({"results": results})
+        if route == "details":
+            self.requests["details"] += 1
+            term = body.get("srcdb", "")
+            await self._delay(term)
+            return web.json_response({
+                "description": self.description,
+                "registration_restrictions": "",
+                "clssnotes": "",
+            })
+        return web.json_response({"fatal": f"unknown route {route}"}, status=404)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/class-search/api/", self.handle)
+        return app
+
+
+async def start_fake_fose(fake: FakeFose, host: str = "127.0.0.1", port: int = 0):
+    """Start the server in the running loop. Returns (runner, base_url)."""
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}/class-search/api/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake FOSE server")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeFose(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    web.run_app(fake.app(), host="127.0.0.1", port=args.port)
@@ -0,0 +1,59 @@
+"""
+Checks how ef_search and the re-rank pool behave around MAX_EF_SEARCH (no database needed).
+Run from the repo root: PYTHONPATH=. python scripts/test_ef_search.py
+"""
+import asyncio
+
+from backend import vector_index
+from backend.vector_index import MAX_EF_SEARCH, candidate_count, effective_ef_search
+
+
+class RecordingSession:
+    """Collects the SET LOCAL statements apply_search_settings issues."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement, *args):
+        self.statements.append(str(statement))
+
+
+async def settings_for(limit: int, iterative: bool) -> list:
+    vector_index._iterative_scan = iterative
+    session = RecordingSession()
+    await vector_index.apply_search_settings(session, limit=limit)
+    return session.statements
+
+
+async def run():
+    # Shallow pages: the full RERANK_FACTOR pool, with ef_search raised to cover it
+    assert candidate_count(20, "binary", 4) == 80
+
+    # The deepest page main.py asks for (MAX_SEARCH_OFFSET 500 + top_k 100 + 1):
+    # the pool is capped at MAX_EF_SEARCH so the scan still fills LIMIT
+    deep = 601
+    assert candidate_count(deep, "binary", 4) == MAX_EF_SEARCH
+    assert candidate_count(deep, "halfvec", 1) == deep
+    # A LIMIT above the cap is never cut below LIMIT
+    assert candidate_count(MAX_EF_SEARCH + 1, "binary", 4) == MAX_EF_SEARCH + 1
+    assert effective_ef_search(None, 20) >= candidate_count(20)
+    assert effective_ef_search(None, deep) >= candidate_count(deep)
+    assert effective_ef_search(None, MAX_EF_SEARCH + 1) == MAX_EF_SEARCH
+
+    # Within the cap no iterative scan is needed for unfiltered queries
+    statements = await settings_for(deep, iterative=True)
+    assert not any("iterative_scan" in s for s in statements), statements
+
+    # Past the cap, iterative scans keep HNSW going until LIMIT is filled
+    statements = await settings_for(MAX_EF_SEARCH + 1, iterative=True)
+    assert f"SET LOCAL hnsw.ef_search = {MAX_EF_SEARCH}" in statements, statements
+    assert "SET LOCAL hnsw.iterative_scan = strict_order" in statements, statements
+
+    # Older pgvector can't scan past ef_search; the settings still apply without error
+    statements = await settings_for(MAX_EF_SEARCH + 1, iterative=False)
+    assert not any("iterative_scan" in s for s in statements), statements
+    print("ef_search cap cases passed")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
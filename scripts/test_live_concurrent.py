@@ -0,0 +1,66 @@
+"""
+Checks the concurrent FOSE fan-out against a local fake server with injected latency.
+Run from the repo root: PYTHONPATH=. python scripts/test_live_concurrent.py
+"""
+import asyncio
+import os
+import time
+
+from scripts.fake_fose_server import FakeFose, start_fake_fose
+
+LATENCY = 0.3
+
+
+async def run():
+    fake = FakeFose(latency=LATENCY, term_latency={"1238": 10.0})
+    runner, base_url = await start_fake_fose(fake)
+    # live_scraper / fose_client read their settings at import time
+    os.environ["FOSE_BASE_URL"] = base_url
+    os.environ.setdefault("FOSE_TIMEOUT", "1")
+    from backend import live_scraper
+
+    try:
+        start = time.perf_counter()
+        details = await live_scraper.fetch_live_course_details("CSCI-UA 473")
+        elapsed = time.perf_counter() - start
+        print(details)
+        print(f"{elapsed:.2f}s, requests: {fake.requests}")
+
+        serial = LATENCY * (len(live_scraper.TERMS) + 1)
+        assert details["available_semesters"][0] == "Summer 2025", details
+        assert "CSCI-UA 310" in details["prerequisites"], details
+        # Early exit must not wait on the 10s term, and fan-out must beat serial calls
+        assert elapsed < serial, f"{elapsed:.2f}s is not faster than serial {serial:.2f}s"
+
+        # A slow answer for the current term must not be replaced by an older one
+        fake.term_latency["1254"] = 0.7
+        details = await live_scraper.fetch_live_course_details("CSCI-UA 473")
+        print(details)
+        assert details["available_semesters"] == ["Summer 2025", "Spring 2025", "Fall 2024"], details
+        assert "Ada Lovelace" in details["professors"] and "Alan Turing" not in details["professors"], details
+        del fake.term_latency["1254"]
+
+        # Half-open breaker: one trial call gets through and the rest are rejected.
+        # Nobody may get a truncated or "not offered" answer, and the trial closes the breaker.
+        from backend.fose_client import CircuitOpenError, FoseClient
+        async with FoseClient() as client:
+            client.breaker.opened_at = time.monotonic() - client.breaker.reset_timeout
+            outcomes = await asyncio.gather(
+                *[live_scraper.fetch_live_course_details("CSCI-UA 473", client) for _ in range(3)],
+                return_exceptions=True,
+            )
+            print(outcomes)
+            assert all(isinstance(o, CircuitOpenError) for o in outcomes), outcomes
+            assert client.breaker.state == "closed", client.breaker.state
+            details = await live_scraper.fetch_live_course_details("CSCI-UA 473", client)
+            assert details["available_semesters"] == ["Summer 2025", "Spring 2025", "Fall 2024"], details
+
+        start = time.perf_counter()
+        missing = await live_scraper.fetch_live_course_details("NOPE-UA 1")
+        print(missing, f"{time.perf_counter() - start:.2f}s")
+        assert missing["professors"] == ["TBD - Consult Department"]
+    finally:
+        await runner.cleanup()
+
+
+asyncio.run(run())
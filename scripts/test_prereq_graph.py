@@ -0,0 +1,34 @@
+"""
+Checks the in-memory prerequisite graph on a hand-built catalog (no database needed).
+Run from the repo root: PYTHONPATH=. python scripts/test_prereq_graph.py
+"""
+from backend.prereq_graph import PrerequisiteGraph
+from backend.prerequisites import prerequisite_records
+
+COURSES = [
+    {"code": "CSCI-UA 101", "description": "Intro to programming."},
+    {"code": "CSCI-UA 102", "description": "Data structures. Prerequisites: CSCI-UA 101."},
+    # "2 semesters" once parsed as CSCI-UA 2; MATH-UA 999 isn't in the catalog at all
+    {"code": "CSCI-UA 201", "description": "Systems. Prerequisites: CSCI-UA 102 and 2 semesters of calculus."},
+    {"code": "CSCI-UA 310", "description": "Algorithms. Prerequisites: CSCI-UA 201 and MATH-UA 999."},
+]
+
+
+def run():
+    graph = PrerequisiteGraph()
+    stats = graph.rebuild(prerequisite_records(COURSES), {c["code"] for c in COURSES})
+
+    assert "MATH-UA 999" not in graph.ids and "CSCI-UA 2" not in graph.ids, graph.codes
+    assert stats["unknown_codes"] == 1, stats
+    chain = graph.course_chain("CSCI-UA 310")
+    assert [e["code"] for e in chain["chain"]] == ["CSCI-UA 101", "CSCI-UA 102", "CSCI-UA 201"], chain
+    assert chain["requires"] == ["CSCI-UA 201"], chain
+    assert "MATH-UA 999" in chain["prerequisites"]
+
+    plan = graph.plan_chain(["CSCI-UA 310", "CSCI-UA 101"])
+    assert plan["missing"] == ["CSCI-UA 102", "CSCI-UA 201"], plan
+    print(f"Prerequisite graph checks passed ({stats['nodes']} nodes, {stats['edges']} edges)")
+
+
+if __name__ == "__main__":
+    run()
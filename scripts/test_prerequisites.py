@@ -0,0 +1,31 @@
+"""
+Regression cases for the catalog prerequisite parser (no database needed).
+Run from the repo root: PYTHONPATH=. python scripts/test_prerequisites.py
+"""
+from backend.prerequisites import parse_prerequisites, referenced_codes
+
+CASES = [
+    # description -> (raw_text, codes), or None when nothing should be stored
+    ("No prereq here.", None),
+    ("Covers sorting. Prerequisites: none.", None),
+    ("Prerequisite: None", None),
+    ("Prerequisites: CSCI-UA 102 and 2 semesters of calculus.",
+     ("CSCI-UA 102 and 2 semesters of calculus.", ["CSCI-UA 102"])),
+    ("Intro to ML. Prerequisites: CSCI-UA 310 and MATH-UA 140. Students build models.",
+     ("CSCI-UA 310 and MATH-UA 140", ["CSCI-UA 310", "MATH-UA 140"])),
+    ("Prerequisites for majors: MATH-UA 121, 122 or 140.",
+     ("MATH-UA 121, 122 or 140.", ["MATH-UA 121", "MATH-UA 122", "MATH-UA 140"])),
+    ("Prereq: CSCI-UA.0101 or 4 credits of programming.", ("CSCI-UA.0101 or 4 credits of programming.", ["CSCI-UA 101"])),
+]
+
+
+def run():
+    for description, expected in CASES:
+        parsed = parse_prerequisites(description)
+        assert parsed == expected, f"{description!r}: got {parsed!r}, expected {expected!r}"
+    assert referenced_codes("CSCI-UA 102 and 2 semesters of calculus") == ["CSCI-UA 102"]
+    print(f"{len(CASES)} prerequisite cases passed")
+
+
+if __name__ == "__main__":
+    run()